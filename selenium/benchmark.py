@@ -0,0 +1,173 @@
+#Measures the crawl and parse paths offline against fixture pages on a local server.
+#
+#    python benchmark.py --pages 40 --workers 4
+#
+#The crawl path is crawler.crawl_jobs() saving into a throwaway snapshot store,
+#exactly like project.py does. The parse path runs data/collect.py on that store,
+#then once more with --profile-json for the time per input of every stage.
+#Every run is appended to bench_results.jsonl together with the git commit and
+#compared with the last run that used the same settings, so regressions show up.
+#Fixtures and results live in a cache folder outside the source tree.
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from crawl_state import CrawlState
+from crawler import crawl_jobs
+from data.snapshot_store import SnapshotStore
+from fixtures import FixtureServer, write_fixture_pages
+from metrics import CrawlMetrics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(os.path.expanduser("~"), ".cache", "flipkart_benchmark")
+
+
+def git_commit():
+    """Returns the short hash of the checked out commit, or None outside a git repo."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Returns the peak resident set size in MB (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def bench_crawl(url, workdir, pages, workers, mode, query="mobile"):
+    """Crawls `pages` fixture pages into a snapshot store in `workdir`."""
+    store = SnapshotStore(os.path.join(workdir, "data", "snapshots"))
+    state = CrawlState(os.path.join(workdir, "data", "crawl_state.json"))
+    metrics = CrawlMetrics()
+    cards = 0
+    start = time.perf_counter()
+    for _, page, page_cards in crawl_jobs(((query, page) for page in range(1, pages + 1)), workers=workers, rate=0, base_url=url, mode=mode, metrics=metrics):
+        cards += len(page_cards)
+        state.save_page(store, query, page, page_cards, metrics.record(query, page))
+        metrics.finish(query, page)
+    seconds = time.perf_counter() - start
+    store.close()
+    summary = metrics.summary()
+    return {
+        "seconds": seconds,
+        "pages_per_sec": pages / seconds,
+        "cards_per_sec": cards / seconds,
+        "cards": cards,
+        "bytes": summary["bytes"],
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": summary["stages"],
+    }
+
+
+def run_collect(workdir, collect_args):
+    """Runs `python -m data.collect` in `workdir`, where it finds the store under data/."""
+    #collect runs in `workdir`, so the package is found through PYTHONPATH.
+    env = {**os.environ, "PYTHONPATH": HERE}
+    subprocess.run([sys.executable, "-m", "data.collect", *collect_args], cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def bench_parse(workdir, collect_args=()):
+    """Runs data/collect.py on the store in `workdir` and measures it from the outside.
+
+    A second, serial run with --profile-json adds the per-input timings of
+    every stage (read, tree and one per field) that collect.py --profile prints.
+    """
+    start = time.perf_counter()
+    run_collect(workdir, collect_args)
+    seconds = time.perf_counter() - start
+    with open(os.path.join(workdir, "data.csv"), newline="", encoding="utf-8") as f:
+        rows = sum(1 for _ in csv.reader(f)) - 1
+    peak_rss = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    profile_path = os.path.join(workdir, "profile.json")
+    run_collect(workdir, [*collect_args, "--profile-json", profile_path])
+    with open(profile_path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    return {
+        "seconds": seconds,
+        "cards_per_sec": rows / seconds,
+        "rows": rows,
+        "peak_rss_mb": peak_rss,
+        "stages": {stage: {key: values[key] for key in ("sum", "p50", "p95", "max")} for stage, values in profile["stages"].items()},
+    }
+
+
+def previous_result(path, settings):
+    """Returns the last result in `path` that was run with the same settings."""
+    if not os.path.exists(path):
+        return None
+    last = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            result = json.loads(line)
+            if result.get("settings") == settings:
+                last = result
+    return last
+
+
+def change(new, old):
+    if not old:
+        return ""
+    return f" ({(new - old) * 100 / old:+.1f}%)"
+
+
+def print_report(result, previous):
+    crawl, parse = result["crawl"], result["parse"]
+    old_crawl = previous["crawl"] if previous else {}
+    old_parse = previous["parse"] if previous else {}
+    if previous:
+        print(f"compared with {previous.get('commit')} at {previous.get('time')}")
+    print(f"crawl: {crawl['pages_per_sec']:.1f} pages/s{change(crawl['pages_per_sec'], old_crawl.get('pages_per_sec'))}, "
+          f"{crawl['cards_per_sec']:.1f} cards/s{change(crawl['cards_per_sec'], old_crawl.get('cards_per_sec'))}, "
+          f"peak RSS {crawl['peak_rss_mb']:.1f} MB{change(crawl['peak_rss_mb'], old_crawl.get('peak_rss_mb'))}")
+    for stage, values in crawl["stages"].items():
+        old = old_crawl.get("stages", {}).get(stage, {})
+        print(f"  {stage:<8} p50 {values['p50'] * 1000:8.2f}ms{change(values['p50'], old.get('p50'))}  "
+              f"p95 {values['p95'] * 1000:8.2f}ms  p99 {values['p99'] * 1000:8.2f}ms")
+    print(f"parse: {parse['cards_per_sec']:.1f} cards/s{change(parse['cards_per_sec'], old_parse.get('cards_per_sec'))}, "
+          f"{parse['rows']} rows in {parse['seconds']:.2f}s, "
+          f"peak RSS {parse['peak_rss_mb']:.1f} MB{change(parse['peak_rss_mb'], old_parse.get('peak_rss_mb'))}")
+    for stage, values in parse.get("stages", {}).items():
+        old = old_parse.get("stages", {}).get(stage, {})
+        print(f"  {stage:<8} p50 {values['p50'] * 1e6:8.1f}µs{change(values['p50'], old.get('p50'))}  "
+              f"p95 {values['p95'] * 1e6:8.1f}µs  total {values['sum']:6.3f}s{change(values['sum'], old.get('sum'))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the crawler and parser against local fixture pages.")
+    parser.add_argument("--fixtures", default=os.path.join(BENCH_DIR, "fixtures"), help="folder of search_<page>.html files; generated when empty")
+    parser.add_argument("--pages", type=int, default=40, help="pages to crawl; fixtures are reused when there are fewer")
+    parser.add_argument("--cards", type=int, default=24, help="cards per generated fixture page")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["http", "browser"], default="http", help="browser mode needs Chrome")
+    parser.add_argument("--parse-workers", type=int, default=1, help="processes data/collect.py parses with")
+    parser.add_argument("--results", default=os.path.join(BENCH_DIR, "bench_results.jsonl"))
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    if not os.path.isdir(args.fixtures) or not os.listdir(args.fixtures):
+        write_fixture_pages(args.fixtures, pages=args.pages, cards=args.cards)
+        print(f"Generated fixture pages in {args.fixtures}")
+
+    settings = {"pages": args.pages, "workers": args.workers, "parse_workers": args.parse_workers, "mode": args.mode, "fixtures": os.path.basename(os.path.normpath(args.fixtures))}
+    with FixtureServer(args.fixtures) as server, tempfile.TemporaryDirectory() as workdir:
+        crawl_result = bench_crawl(server.url, workdir, args.pages, args.workers, args.mode)
+        parse_result = bench_parse(workdir, ["--workers", str(args.parse_workers)])
+
+    result = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "settings": settings,
+        "crawl": crawl_result,
+        "parse": parse_result,
+    }
+    print_report(result, previous_result(args.results, settings))
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(result) + "\n")
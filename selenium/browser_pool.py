@@ -0,0 +1,384 @@
+#Keeps a few headless Chromes running between crawls and leases them out, so a
+#crawl starts fetching right away instead of waiting for Chrome to launch.
+#
+#    python browser_pool.py serve --size 4            # leave running
+#    python project.py --browser-pool http://127.0.0.1:9400 ...
+#
+#The service answers JSON over HTTP on localhost:
+#
+#    POST /lease    {"wait": 30}    -> {"lease": "...", "debugger_address": "127.0.0.1:PORT", "ttl": 90}
+#    POST /renew    {"lease": "..."}
+#    POST /release  {"lease": "..."}
+#    GET  /status                   -> the browsers and their leases
+#
+#A leased browser is used through its DevTools address, the way Selenium's
+#debuggerAddress option attaches to a running Chrome: lease_driver() starts
+#only a chromedriver attached to it, and cdp.py can use the address directly.
+#Before a browser is leased out again its extra tabs are closed, the remaining
+#tab goes to about:blank and cookies, cache and site storage are cleared.
+#Idle browsers are health-checked in the background and replaced when they do
+#not answer. A lease lasts `lease_ttl` seconds from its last renewal; a
+#LeasedChrome renews it every third of that for as long as it runs, so only
+#the browsers of clients that are gone (killed, hung, disconnected) are taken
+#back, however long a crawl takes.
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+import driver_factory
+from cdp import browser_websocket_url, driver_debugger_address
+
+POOL_URL = "http://127.0.0.1:9400"
+#Origins whose site data is wiped between leases.
+RESET_ORIGINS = ("https://www.flipkart.com",)
+#Stands in for the lease id of a browser being reset or health-checked.
+BUSY = "busy"
+
+
+class Browser:
+    """One Chrome the pool owns, through the driver that started it."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.address = driver_debugger_address(driver)
+        self.lease = None
+        self.leased_at = None
+        self.leases = 0
+
+
+def healthy(browser):
+    """Returns True if the browser answers both its DevTools endpoint and its driver."""
+    try:
+        browser_websocket_url(browser.address)
+        return browser.driver.execute_script("return 1") == 1
+    except Exception:
+        return False
+
+
+def reset(browser):
+    """Brings a returned browser back to one blank tab without cookies, cache or site data."""
+    driver = browser.driver
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    driver.get("about:blank")
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    for origin in RESET_ORIGINS:
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+
+
+class BrowserPool:
+    """A fixed number of running browsers handed out one lease at a time."""
+
+    def __init__(self, size=4, make_driver=driver_factory.make_driver, lease_ttl=90, check_every=30):
+        self.size = size
+        self.make_driver = make_driver
+        self.lease_ttl = lease_ttl
+        self.check_every = check_every
+        self.browsers = []
+        self.condition = threading.Condition()
+        self.closed = threading.Event()
+        self.maintainer = threading.Thread(target=self.maintain, daemon=True)
+
+    def start(self):
+        """Launches the browsers, all at once, and starts the health checks."""
+        threads = [threading.Thread(target=self.add_browser) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.maintainer.start()
+        return self
+
+    def add_browser(self):
+        try:
+            browser = Browser(self.make_driver())
+        except Exception as e:
+            print(f"Failed to start a browser: {e}")
+            return
+        with self.condition:
+            self.browsers.append(browser)
+            self.condition.notify()
+
+    def replace(self, browser):
+        """Quits a broken browser and starts another in its place."""
+        with self.condition:
+            if browser in self.browsers:
+                self.browsers.remove(browser)
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            print(f"Failed to quit browser {browser.address}: {e}")
+        if not self.closed.is_set():
+            self.add_browser()
+
+    def lease(self, wait=30):
+        """Returns (lease id, debugger address) of an idle browser, or None if none frees up within `wait` seconds."""
+        deadline = time.monotonic() + wait
+        with self.condition:
+            while True:
+                idle = [browser for browser in self.browsers if browser.lease is None]
+                if idle:
+                    browser = min(idle, key=lambda browser: browser.leases)
+                    browser.lease = uuid.uuid4().hex
+                    browser.leased_at = time.monotonic()
+                    browser.leases += 1
+                    return browser.lease, browser.address
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.closed.is_set():
+                    return None
+                self.condition.wait(remaining)
+
+    def renew(self, lease):
+        """Extends `lease` by another `lease_ttl` seconds. Returns False for an unknown or expired lease."""
+        with self.condition:
+            browser = next((browser for browser in self.browsers if browser.lease == lease), None)
+            if browser is None:
+                return False
+            browser.leased_at = time.monotonic()
+            return True
+
+    def release(self, lease):
+        """Resets the browser of `lease` and makes it available again. Returns False for an unknown lease."""
+        with self.condition:
+            browser = next((browser for browser in self.browsers if browser.lease == lease), None)
+            if browser is None:
+                return False
+            browser.lease, browser.leased_at = BUSY, None
+        self.give_back(browser)
+        return True
+
+    def give_back(self, browser):
+        try:
+            reset(browser)
+        except Exception as e:
+            print(f"Resetting browser {browser.address} failed, replacing it: {e}")
+            self.replace(browser)
+            return
+        with self.condition:
+            browser.lease = None
+            browser.leased_at = None
+            self.condition.notify()
+
+    def maintain(self):
+        """Takes back expired leases and replaces idle browsers that fail their health check."""
+        while not self.closed.wait(self.check_every):
+            now = time.monotonic()
+            with self.condition:
+                expired = [browser for browser in self.browsers if browser.leased_at is not None and now - browser.leased_at > self.lease_ttl]
+                idle = [browser for browser in self.browsers if browser.lease is None]
+                #Marked busy while they are reset or checked, so they are neither handed out nor returned meanwhile.
+                for browser in expired + idle:
+                    browser.lease, browser.leased_at = BUSY, None
+            for browser in expired:
+                print(f"Lease on {browser.address} expired, taking the browser back")
+                self.give_back(browser)
+            for browser in idle:
+                if healthy(browser):
+                    with self.condition:
+                        browser.lease = None
+                        self.condition.notify()
+                else:
+                    print(f"Browser {browser.address} failed its health check, replacing it")
+                    self.replace(browser)
+
+    def status(self):
+        with self.condition:
+            return [
+                {"debugger_address": browser.address, "leased": browser.lease is not None, "leases": browser.leases}
+                for browser in self.browsers
+            ]
+
+    def close(self):
+        """Quits every browser."""
+        self.closed.set()
+        with self.condition:
+            browsers, self.browsers = self.browsers, []
+            self.condition.notify_all()
+        for browser in browsers:
+            try:
+                browser.driver.quit()
+            except Exception as e:
+                print(f"Failed to quit browser {browser.address}: {e}")
+
+
+def pool_server(pool, port=9400):
+    """Returns the HTTP server handing out leases on `pool` on localhost; port 0 picks a free one."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/status":
+                self.reply(200, {"browsers": pool.status()})
+            else:
+                self.reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.reply(400, {"error": "invalid JSON"})
+                return
+            if self.path == "/lease":
+                leased = pool.lease(float(request.get("wait", 30)))
+                if leased is None:
+                    self.reply(503, {"error": "no browser free"})
+                else:
+                    self.reply(200, {"lease": leased[0], "debugger_address": leased[1], "ttl": pool.lease_ttl})
+            elif self.path == "/renew":
+                if pool.renew(request.get("lease")):
+                    self.reply(200, {})
+                else:
+                    self.reply(404, {"error": "unknown lease"})
+            elif self.path == "/release":
+                if pool.release(request.get("lease")):
+                    self.reply(200, {})
+                else:
+                    self.reply(404, {"error": "unknown lease"})
+            else:
+                self.reply(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(pool, port=9400):
+    """Serves `pool` on localhost until interrupted."""
+    server = pool_server(pool, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class PoolClient:
+    """Talks to a running browser pool service."""
+
+    def __init__(self, url=POOL_URL):
+        self.url = url.rstrip("/")
+
+    def call(self, path, body=None, timeout=10):
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        with urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+
+    def lease(self, wait=30):
+        """Returns {"lease", "debugger_address", "ttl"} of a browser, waiting up to `wait` seconds for one."""
+        return self.call("/lease", {"wait": wait}, timeout=wait + 10)
+
+    def call_lease(self, path, lease):
+        """Posts a lease id; returns False if the pool does not know the lease (anymore)."""
+        try:
+            self.call(path, {"lease": lease})
+        except HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+        return True
+
+    def renew(self, lease):
+        return self.call_lease("/renew", lease)
+
+    def release(self, lease):
+        return self.call_lease("/release", lease)
+
+    def status(self):
+        return self.call("/status")["browsers"]
+
+
+def keep_leased(client, lease, stopped):
+    """Renews `lease` every third of its ttl until `stopped` is set; runs in its own thread."""
+    while not stopped.wait(lease["ttl"] / 3):
+        try:
+            if not client.renew(lease["lease"]):
+                print(f"Lease on {lease['debugger_address']} was taken back by the pool")
+                return
+        except Exception as e:
+            #The next renewal may still get through before the lease runs out.
+            print(f"Failed to renew the lease on {lease['debugger_address']}: {e}")
+
+
+class LeasedChrome(webdriver.Chrome):
+    """A driver attached to a browser leased from the pool; it keeps the lease alive and quit() hands the browser back."""
+
+    def __init__(self, client, lease):
+        self.client = client
+        self.lease = lease
+        options = Options()
+        options.debugger_address = lease["debugger_address"]
+        options.page_load_strategy = "eager"
+        super().__init__(options=options)
+        self.stopped = threading.Event()
+        threading.Thread(target=keep_leased, args=(client, lease, self.stopped), daemon=True).start()
+
+    def quit(self):
+        """Stops the attached chromedriver, leaving the browser running, and returns the lease."""
+        self.stopped.set()
+        try:
+            self.service.stop()
+        finally:
+            if not self.client.release(self.lease["lease"]):
+                print(f"Lease on {self.lease['debugger_address']} had already been taken back by the pool")
+
+
+def lease_driver(pool_url=POOL_URL, profile="lean", wait=30):
+    """Leases a browser from the pool at `pool_url` and returns a driver attached to it."""
+    client = PoolClient(pool_url)
+    lease = client.lease(wait)
+    try:
+        driver = LeasedChrome(client, lease)
+    except Exception:
+        client.release(lease["lease"])
+        raise
+    #URL blocking belongs to the DevTools session, so the new driver sets it up again.
+    if profile == "lean":
+        driver_factory.block_urls(driver)
+    return driver
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keeps warm headless browsers for crawl jobs to lease.")
+    parser.add_argument("command", choices=["serve", "status"])
+    parser.add_argument("--size", type=int, default=4, help="number of browsers kept running")
+    parser.add_argument("--port", type=int, default=9400)
+    parser.add_argument("--profile", choices=["lean", "default"], default="lean", help="lean: headless and blocks images, fonts and trackers")
+    parser.add_argument("--lease-ttl", type=float, default=90, help="seconds without a renewal after which a lease is taken back")
+    parser.add_argument("--check-every", type=float, default=30, help="seconds between health checks of idle browsers")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for browser in PoolClient(f"http://127.0.0.1:{args.port}").status():
+            print(f"{browser['debugger_address']}  {'leased' if browser['leased'] else 'idle':<6}  {browser['leases']} leases")
+    else:
+        pool = BrowserPool(args.size, lambda: driver_factory.make_driver(args.profile), args.lease_ttl, args.check_every).start()
+        print(f"{len(pool.browsers)} browsers ready, serving leases on http://127.0.0.1:{args.port}")
+        try:
+            serve(pool, args.port)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.close()
@@ -0,0 +1,17 @@
+#Reads every matching element of a page in a single WebDriver call.
+#`elem.get_attribute(...)` and `elem.text` are one HTTP round trip per element,
+#so a page with 40 cards costs 40+ round trips. These helpers run one script
+#in the browser that collects all of them at once.
+
+OUTER_HTML_JS = "return Array.from(document.getElementsByClassName(arguments[0]), e => e.outerHTML);"
+TEXT_JS = "return Array.from(document.getElementsByClassName(arguments[0]), e => e.innerText);"
+
+
+def bulk_outer_html(driver, class_name):
+    """Returns the outerHTML of every element with `class_name`, in page order."""
+    return driver.execute_script(OUTER_HTML_JS, class_name) or []
+
+
+def bulk_text(driver, class_name):
+    """Returns the visible text of every element with `class_name`, in page order."""
+    return driver.execute_script(TEXT_JS, class_name) or []
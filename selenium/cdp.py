@@ -0,0 +1,410 @@
+#Crawls with many tabs of one Chrome, driven over the DevTools protocol (CDP)
+#from a single asyncio event loop, instead of one Chrome per worker.
+#
+#Loading a search page is mostly waiting on the network, so one browser can
+#keep several tabs loading at once for the memory of a renderer per tab rather
+#than a whole browser per worker. The engine attaches the way Selenium's
+#debuggerAddress option does: it reads the browser's WebSocket URL from
+#http://<host:port>/json/version and speaks CDP over it. That works with any
+#Chrome started with --remote-debugging-port, and with the one behind a
+#Selenium driver, which is what crawl_jobs_cdp() starts when it is not given
+#an address.
+#
+#Every tab is its own session on the shared connection (flattened
+#Target.attachToTarget). A page is loaded with Page.navigate, polled until the
+#product grid exists and its cards are read in one Runtime.evaluate call, as
+#bulk.py does over WebDriver. The WebSocket client is a minimal RFC 6455 one on
+#asyncio streams, so no extra package is needed.
+#
+#The event loop runs on a thread of its own, so the tabs keep being polled
+#while the caller is busy with a page it was handed, e.g. saving it or waiting
+#for room in pipeline.py's queue.
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import driver_factory
+from crawler import CARD_CLASS, SEARCH_URL, RateLimiter, search_url
+from driver_factory import BLOCKED_URLS
+from metrics import count, timed
+from readiness import Readiness
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+#Set on a tab's document before navigating away, so a poll can tell the old page from the new one.
+STALE_MARK = "__crawlerStale"
+
+
+class ConnectionClosed(Exception):
+    """Raised when the DevTools connection is closed."""
+
+
+class CdpError(Exception):
+    """Raised when the browser answers a command with an error."""
+
+
+def masked(data, mask):
+    """XORs `data` with the repeated 4-byte `mask`."""
+    size = len(data)
+    key = (mask * (size // 4 + 1))[:size]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(size, "big")
+
+
+class WebSocket:
+    """Just enough of a WebSocket client for CDP: text messages, pings and close."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, url):
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        writer.write((
+            f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        status = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        if b" 101 " not in status or headers.get("sec-websocket-accept") != accept:
+            writer.close()
+            raise ConnectionError(f"WebSocket handshake with {url} failed: {status.decode('latin-1').strip()}")
+        return cls(reader, writer)
+
+    async def send_frame(self, opcode, payload):
+        """Sends one final, masked frame, as clients must."""
+        size = len(payload)
+        if size < 126:
+            header = struct.pack(">BB", 0x80 | opcode, 0x80 | size)
+        elif size < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 0x80 | 126, size)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 0x80 | 127, size)
+        mask = os.urandom(4)
+        async with self.lock:
+            self.writer.write(header + mask + masked(payload, mask))
+            await self.writer.drain()
+
+    async def send(self, text):
+        await self.send_frame(0x1, text.encode("utf-8"))
+
+    async def recv(self):
+        """Returns the next text message, answering pings on the way."""
+        fragments = []
+        while True:
+            first, second = await self.reader.readexactly(2)
+            size = second & 0x7F
+            if size == 126:
+                size, = struct.unpack(">H", await self.reader.readexactly(2))
+            elif size == 127:
+                size, = struct.unpack(">Q", await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if second & 0x80 else None
+            payload = await self.reader.readexactly(size)
+            if mask:
+                payload = masked(payload, mask)
+            opcode = first & 0x0F
+            if opcode == 0x8:
+                raise ConnectionClosed("The browser closed the DevTools connection")
+            if opcode == 0x9:
+                await self.send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            fragments.append(payload)
+            if first & 0x80:
+                return b"".join(fragments).decode("utf-8")
+
+    async def close(self):
+        try:
+            await self.send_frame(0x8, struct.pack(">H", 1000))
+        except (ConnectionError, RuntimeError):
+            pass
+        self.writer.close()
+
+
+def browser_websocket_url(debugger_address):
+    """Returns the browser-level DevTools WebSocket URL of the Chrome at host:port."""
+    with urlopen(f"http://{debugger_address}/json/version", timeout=10) as response:
+        return json.load(response)["webSocketDebuggerUrl"]
+
+
+def driver_debugger_address(driver):
+    """Returns the host:port a Selenium Chrome driver's browser listens on for DevTools."""
+    return driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+
+
+class CdpConnection:
+    """One DevTools connection to the browser; replies are matched to commands by id.
+
+    Events are not subscribed to: pages are polled instead, so the messages
+    without an id are dropped.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.next_id = 0
+        self.replies = {}
+        self.reader = asyncio.create_task(self.read_replies())
+
+    @classmethod
+    async def open(cls, debugger_address):
+        url = await asyncio.to_thread(browser_websocket_url, debugger_address)
+        return cls(await WebSocket.connect(url))
+
+    async def send(self, method, params=None, session_id=None):
+        """Sends a command, to a tab if `session_id` is given, and returns its result."""
+        if self.reader.done():
+            raise ConnectionClosed("The DevTools connection is closed")
+        self.next_id += 1
+        message = {"id": self.next_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        reply = asyncio.get_running_loop().create_future()
+        self.replies[self.next_id] = reply
+        await self.websocket.send(json.dumps(message))
+        return await reply
+
+    async def read_replies(self):
+        try:
+            while True:
+                message = json.loads(await self.websocket.recv())
+                reply = self.replies.pop(message.get("id"), None)
+                if reply is None or reply.done():
+                    continue
+                if "error" in message:
+                    reply.set_exception(CdpError(f"{message['error'].get('message')} ({message['error'].get('code')})"))
+                else:
+                    reply.set_result(message.get("result", {}))
+        except (ConnectionClosed, ConnectionError, asyncio.IncompleteReadError) as e:
+            for reply in self.replies.values():
+                if not reply.done():
+                    reply.set_exception(ConnectionClosed(str(e)))
+            self.replies.clear()
+
+    async def close(self):
+        self.reader.cancel()
+        await self.websocket.close()
+
+
+class Tab:
+    """A browser tab attached to the connection as its own session."""
+
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+
+    @classmethod
+    async def open(cls, connection, blocked=BLOCKED_URLS):
+        """Opens a blank tab, blocking `blocked` URL patterns in it like the lean driver profile."""
+        target = await connection.send("Target.createTarget", {"url": "about:blank"})
+        session = await connection.send("Target.attachToTarget", {"targetId": target["targetId"], "flatten": True})
+        tab = cls(connection, target["targetId"], session["sessionId"])
+        if blocked:
+            await tab.send("Network.enable")
+            await tab.send("Network.setBlockedURLs", {"urls": list(blocked)})
+        return tab
+
+    async def send(self, method, params=None):
+        return await self.connection.send(method, params, self.session_id)
+
+    async def evaluate(self, expression):
+        """Runs `expression` in the tab's page and returns its value."""
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True})
+        if "exceptionDetails" in result:
+            raise CdpError(result["exceptionDetails"].get("text", "Script failed"))
+        return result["result"].get("value")
+
+    async def navigate(self, url):
+        """Starts loading `url`; returns False if the navigation failed outright."""
+        await self.evaluate(f"window.{STALE_MARK} = true")
+        result = await self.send("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            print(f"Navigation to {url} failed: {result['errorText']}")
+            return False
+        return True
+
+    async def wait_for(self, class_name, timeout=10, poll=0.1):
+        """Waits until the new page has an element with `class_name`. Returns True if it appeared."""
+        check = f"!window.{STALE_MARK} && document.getElementsByClassName({json.dumps(class_name)}).length > 0"
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if await self.evaluate(check):
+                    return True
+            except CdpError:
+                #The old document went away mid-call; the new one is still being set up.
+                pass
+            #The page is checked once more after the deadline, in case the loop was held up past it.
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(min(poll, max(0.0, deadline - time.monotonic())))
+
+    async def outer_html(self, class_name):
+        """Returns the outerHTML of every element with `class_name`, in page order."""
+        return await self.evaluate(f"Array.from(document.getElementsByClassName({json.dumps(class_name)}), e => e.outerHTML)") or []
+
+    async def close(self):
+        await self.connection.send("Target.closeTarget", {"targetId": self.target_id})
+
+
+async def fetch_tab(tab, limiter, readiness, url, class_name=CARD_CLASS, record=None):
+    """Loads `url` in `tab` and returns the outerHTML of every card.
+
+    A page that is not ready before the timeout is loaded once more.
+    """
+    for attempt in range(2):
+        await asyncio.sleep(readiness.delay())
+        await asyncio.sleep(max(0.0, limiter.reserve(url)))
+        with timed(record, "navigate"):
+            started = await tab.navigate(url)
+        start = time.monotonic()
+        with timed(record, "wait"):
+            ready = started and await tab.wait_for(class_name, readiness.timeout())
+        readiness.record(url, time.monotonic() - start, ready)
+        if ready or attempt:
+            break
+        count(record, "retries")
+    with timed(record, "extract"):
+        return await tab.outer_html(class_name)
+
+
+async def crawl_tabs(jobs, debugger_address, tabs=8, rate=2.0, base_url=SEARCH_URL, class_name=CARD_CLASS, readiness=None, cache=None, metrics=None, blocked=BLOCKED_URLS):
+    """Fetches (query, page) jobs in `tabs` tabs of the browser at `debugger_address`.
+
+    Yields (query, page, cards) in job order with at most two jobs per tab in
+    flight. Takes the same rate limit, readiness, cache and metrics as
+    crawler.crawl_jobs().
+    """
+    connection = await CdpConnection.open(debugger_address)
+    limiter = RateLimiter(rate)
+    if readiness is None:
+        readiness = Readiness(class_name)
+    idle = asyncio.Queue()
+    opened = []
+    window = deque()
+
+    async def fetch(url, record):
+        if cache is not None:
+            cards, _ = cache.lookup(url)
+            if cards is not None:
+                count(record, "items", len(cards))
+                return cards
+        tab = await idle.get()
+        try:
+            cards = await fetch_tab(tab, limiter, readiness, url, class_name, record)
+        finally:
+            idle.put_nowait(tab)
+        if cache is not None and cards:
+            cache.put(url, cards)
+        count(record, "items", len(cards))
+        return cards
+
+    try:
+        for _ in range(tabs):
+            tab = await Tab.open(connection, blocked)
+            opened.append(tab)
+            idle.put_nowait(tab)
+        for query, page in jobs:
+            url = search_url(query, page, base_url)
+            record = metrics.start(query, page, url) if metrics else None
+            window.append((query, page, asyncio.create_task(fetch(url, record))))
+            if len(window) >= tabs * 2:
+                query, page, task = window.popleft()
+                yield query, page, await task
+        while window:
+            query, page, task = window.popleft()
+            yield query, page, await task
+    finally:
+        for _, _, task in window:
+            task.cancel()
+        for tab in opened:
+            try:
+                await tab.close()
+            except Exception as e:
+                print(f"Failed to close tab: {e}")
+        await connection.close()
+
+
+#Put on the results queue after the last page.
+END = object()
+
+
+async def pump(crawled, results, failed, finished):
+    """Moves crawl_tabs() output onto the `results` queue, then END; runs on the loop's thread.
+
+    Waiting for room on the queue only holds back new jobs; the tabs already
+    loading keep being polled.
+    """
+    try:
+        try:
+            async for item in crawled:
+                await results.put(item)
+        except Exception as e:
+            failed.append(e)
+        finally:
+            #Closes the tabs and the connection, also when the caller stopped early and the pump was cancelled.
+            await crawled.aclose()
+        await results.put(END)
+    finally:
+        finished.set()
+
+
+def crawl_jobs_cdp(jobs, workers=8, rate=2.0, base_url=SEARCH_URL, class_name=CARD_CLASS, make_driver=driver_factory.make_driver, readiness=None, cache=None, metrics=None, debugger_address=None):
+    """Runs crawl_tabs() with `workers` tabs and yields its (query, page, cards) like crawler.crawl_jobs().
+
+    Without a `debugger_address` a single browser is started with
+    `make_driver` and the tabs are opened in it. The event loop runs on its own
+    thread and hands pages over through a queue of `workers` pages, so the
+    open tabs keep loading and being polled however long the caller takes.
+    """
+    driver = None
+    if debugger_address is None:
+        driver = make_driver()
+        debugger_address = driver_debugger_address(driver)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    results = asyncio.Queue(maxsize=workers)
+    failed = []
+    finished = threading.Event()
+    crawled = crawl_tabs(jobs, debugger_address, workers, rate, base_url, class_name, readiness, cache, metrics)
+    pumping = asyncio.run_coroutine_threadsafe(pump(crawled, results, failed, finished), loop)
+    try:
+        while True:
+            item = asyncio.run_coroutine_threadsafe(results.get(), loop).result()
+            if item is END:
+                break
+            yield item
+        if failed:
+            raise failed[0]
+    finally:
+        pumping.cancel()
+        finished.wait()
+        #Like asyncio.run(), also joins the thread the connection's DNS lookups ran on.
+        asyncio.run_coroutine_threadsafe(loop.shutdown_asyncgens(), loop).result()
+        asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        if driver is not None:
+            driver.quit()
@@ -0,0 +1,2 @@
+#Lets the tests under tests/ import the crawler modules and the data package
+#the way the scripts do, with this folder on sys.path.
@@ -0,0 +1,116 @@
+#Remembers which pages and products a crawl has already saved so a rerun can resume.
+#
+#Finished pages and file counters live in a small JSON file that is rewritten
+#after every page. The products already saved are kept apart in an append-only
+#dedupe index (data/dedupe.py) next to it, so the JSON stays small however
+#many products have been seen.
+#
+#Every run is one crawl: the cards it saves are stamped with the time it
+#started, which data/history.py records their prices under.
+import json
+import os
+import re
+import time
+
+from data.dedupe import SeenIndex, canonical_link
+from metrics import count, timed
+
+HREF = re.compile(r'<a\b[^>]*\bhref="([^"]+)"', re.IGNORECASE)
+
+
+def product_key(card_html):
+    """Returns a key identifying the product in a card: its canonical link, or None."""
+    match = HREF.search(card_html)
+    if not match:
+        return None
+    return canonical_link(match.group(1).replace("&amp;", "&"))
+
+
+class CrawlState:
+    """JSON file with the finished (query, page) pairs and file counters, plus the index of seen products."""
+
+    def __init__(self, path="data/crawl_state.json"):
+        self.path = path
+        self.done = {}
+        self.seen = SeenIndex(os.path.splitext(path)[0] + ".seen")
+        self.next_file = {}
+        self.started = int(time.time())
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.done = {query: set(pages) for query, pages in state.get("done", {}).items()}
+            #State files written before the dedupe index kept the seen products in the JSON.
+            for key in state.get("seen", []):
+                self.seen.add(canonical_link(key))
+            self.next_file = state.get("next_file", {})
+
+    def is_done(self, query, page):
+        return page in self.done.get(query, ())
+
+    def pending(self, query, pages):
+        """Returns the pages of `query` that have not been finished yet."""
+        return [page for page in pages if not self.is_done(query, page)]
+
+    def restart(self, query):
+        """Forgets the finished pages of `query` so they are crawled again; its products stay seen."""
+        self.done.pop(query, None)
+
+    def is_new(self, key):
+        """Returns True and remembers `key` the first time a product is seen."""
+        if key is None:
+            return True
+        return self.seen.add(key)
+
+    def resume(self, store, query):
+        """Returns the next file number for `query`, counting cards stored after the last save."""
+        file = self.next_file.get(query, 0)
+        #Cards stored after the last state write, e.g. by a run killed mid-page, still count as seen.
+        while f"{query}_{file}" in store:
+            self.is_new(product_key(store.get(f"{query}_{file}")))
+            file += 1
+        self.next_file[query] = file
+        return file
+
+    def save_page(self, store, query, page, cards, record=None):
+        """Stores the new products of one page and marks it done. Returns how many were stored."""
+        file = self.next_file.get(query, 0)
+        keys = []
+        saved = 0
+        with timed(record, "write"):
+            for card in cards:
+                #Skips products already saved by this or an earlier run, or earlier on this page.
+                key = product_key(card)
+                if key is not None and (key in self.seen or key in keys):
+                    continue
+                if key is not None:
+                    keys.append(key)
+                count(record, "bytes", store.put(f"{query}_{file}", card, self.started))
+                file += 1
+                saved += 1
+            #The cards are on disk before their keys, so a crash in between
+            #leaves stored cards that resume() marks seen, never seen products
+            #that were not stored. The page only counts as done after both.
+            store.flush()
+            for key in keys:
+                self.seen.add(key)
+            self.finish_page(query, page, file)
+        return saved
+
+    def finish_page(self, query, page, next_file):
+        """Marks a page as saved and stores the next file number, then writes the state."""
+        self.done.setdefault(query, set()).add(page)
+        self.next_file[query] = next_file
+        self.save()
+
+    def save(self):
+        """Writes the state to a temporary file and swaps it in so a crash never leaves half a file."""
+        #Products are made durable first so a finished page never has unrecorded products.
+        self.seen.flush()
+        state = {
+            "done": {query: sorted(pages) for query, pages in self.done.items()},
+            "next_file": self.next_file,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,197 @@
+#Crawls Flipkart search result pages with a pool of headless Chrome drivers.
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from bulk import bulk_outer_html
+import driver_factory
+from data.fieldspec import CARD_CLASS
+from http_fetch import HttpPool, cards_from_html
+from metrics import count, timed
+from readiness import Readiness
+
+SEARCH_URL = "https://www.flipkart.com/search?q={query}&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page={page}"
+
+
+class RateLimiter:
+    """Spaces out requests to the same host so they never exceed `per_second`."""
+
+    def __init__(self, per_second=2.0):
+        self.interval = 1.0 / per_second if per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def reserve(self, url):
+        """Books the next slot for the host of `url` and returns the seconds until it."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        return slot - now
+
+    def wait(self, url):
+        """Blocks until the host of `url` may be requested again."""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class DriverPool:
+    """Hands every worker thread its own driver and closes them all at the end."""
+
+    def __init__(self, make_driver=driver_factory.make_driver):
+        self.make_driver = make_driver
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.drivers = []
+
+    def get(self):
+        """Returns the calling thread's driver, starting one the first time."""
+        driver = getattr(self.local, "driver", None)
+        if driver is None:
+            driver = self.make_driver()
+            self.local.driver = driver
+            with self.lock:
+                self.drivers.append(driver)
+        return driver
+
+    def close(self):
+        """Quits every driver the pool has started."""
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                print(f"Failed to quit driver: {e}")
+
+
+def search_url(query, page, base_url=SEARCH_URL):
+    """Builds the search results URL for one page of a query."""
+    return base_url.format(query=query, page=page)
+
+
+def fetch_cards(pool, limiter, readiness, url, class_name=CARD_CLASS, record=None):
+    """Loads `url` in the worker's driver and returns the outerHTML of every card.
+
+    A page that is not ready before the timeout is loaded once more.
+    """
+    driver = pool.get()
+    for attempt in range(2):
+        readiness.pause()
+        limiter.wait(url)
+        with timed(record, "navigate"):
+            driver.get(url)
+        with timed(record, "wait"):
+            _, ready = readiness.wait(driver, url)
+        if ready or attempt:
+            break
+        count(record, "retries")
+    with timed(record, "extract"):
+        return bulk_outer_html(driver, class_name)
+
+
+def fetch_cards_http(http, pool, limiter, readiness, url, class_name=CARD_CLASS, cache=None, entry=None, record=None):
+    """Downloads `url` without a browser and returns its cards.
+
+    Falls back to loading the page in a driver when the server response does
+    not contain any cards, e.g. when they are rendered by JavaScript. A stale
+    cache `entry` is revalidated with its ETag/Last-Modified headers.
+    """
+    limiter.wait(url)
+    headers = {}
+    try:
+        with timed(record, "navigate"):
+            _, status, headers, html = http.get(url, cache.validators(entry) if cache else None)
+        if status == 304 and entry is not None:
+            return cache.revalidated(url, entry)
+        with timed(record, "extract"):
+            cards = cards_from_html(html, class_name) if status == 200 else []
+    except Exception as e:
+        print(f"HTTP fetch failed for {url}: {e}")
+        cards = []
+    if cards:
+        if cache is not None:
+            cache.put(url, cards, headers.get("ETag"), headers.get("Last-Modified"))
+        return cards
+    print(f"No cards in the server response, using the browser: {url}")
+    count(record, "retries")
+    cards = fetch_cards(pool, limiter, readiness, url, class_name, record)
+    if cache is not None and cards:
+        cache.put(url, cards)
+    return cards
+
+
+def fetch_page(cache, mode, http, pool, limiter, readiness, url, class_name=CARD_CLASS, record=None):
+    """Returns the cards of `url` from the cache, or fetches them in the given mode."""
+    entry = None
+    if cache is not None:
+        cards, entry = cache.lookup(url)
+        if cards is not None:
+            count(record, "items", len(cards))
+            return cards
+    if mode == "http":
+        cards = fetch_cards_http(http, pool, limiter, readiness, url, class_name, cache, entry, record)
+    else:
+        cards = fetch_cards(pool, limiter, readiness, url, class_name, record)
+        if cache is not None and cards:
+            cache.put(url, cards)
+    count(record, "items", len(cards))
+    return cards
+
+
+def crawl_jobs(jobs, workers=4, rate=2.0, base_url=SEARCH_URL, class_name=CARD_CLASS, make_driver=driver_factory.make_driver, readiness=None, mode="browser", cache=None, metrics=None, debugger_address=None):
+    """Fetches (query, page) jobs concurrently and yields (query, page, cards) in job order.
+
+    Jobs are handed to at most `workers` drivers and each host is requested at
+    most `rate` times per second. Results come back in the order of `jobs`
+    whatever order the workers finish in, so file numbering stays stable, and
+    only a small window of jobs is in flight at a time.
+    Each page is read as soon as `readiness` sees the product grid.
+    With mode="http" pages are downloaded over pooled connections and a driver
+    is only started for pages whose response has no cards.
+    Pages found in `cache` (a PageCache) are not fetched at all.
+    Every page gets a record in `metrics` (a CrawlMetrics) that the caller
+    finishes once the page is saved.
+    With mode="cdp" the workers are tabs of a single browser driven over the
+    DevTools protocol, see cdp.py; `debugger_address` attaches to a running one.
+    """
+    if mode == "cdp":
+        #Imported here because cdp.py builds on this module.
+        from cdp import crawl_jobs_cdp
+        yield from crawl_jobs_cdp(jobs, workers, rate, base_url, class_name, make_driver, readiness, cache, metrics, debugger_address)
+        return
+    pool = DriverPool(make_driver)
+    limiter = RateLimiter(rate)
+    http = HttpPool(size=workers)
+    if readiness is None:
+        readiness = Readiness(class_name)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            window = deque()
+            for query, page in jobs:
+                url = search_url(query, page, base_url)
+                record = metrics.start(query, page, url) if metrics else None
+                future = executor.submit(fetch_page, cache, mode, http, pool, limiter, readiness, url, class_name, record)
+                window.append((query, page, future))
+                if len(window) >= workers * 2:
+                    query, page, future = window.popleft()
+                    yield query, page, future.result()
+            while window:
+                query, page, future = window.popleft()
+                yield query, page, future.result()
+    finally:
+        http.close()
+        pool.close()
+
+
+def crawl(query, pages, **options):
+    """Fetches `pages` of one query concurrently and yields (page, cards) in page order.
+
+    Takes the same options as crawl_jobs().
+    """
+    for _, page, cards in crawl_jobs(((query, page) for page in pages), **options):
+        yield page, cards
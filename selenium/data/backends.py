@@ -0,0 +1,211 @@
+#HTML parser backends for reading the fields of fieldspec.py out of a saved product card.
+#
+#    bs4         BeautifulSoup with the built-in html.parser (the original, slowest)
+#    lxml        lxml.html with precompiled XPath
+#    selectolax  selectolax's lexbor CSS-selector parser, the lightest of the three
+#
+#Each backend compiles the field selectors once and evaluates them inside the
+#product container only; bs4 does not even build the tree outside of it.
+#lxml and selectolax are optional; asking for a backend whose package is not
+#installed raises an ImportError naming the package. Any of them can sit behind
+#the regex fast path of fastpath.py ("bs4+fast", ...). Every backend must return
+#exactly what the bs4 one returns, which `python -m data.backends` verifies on
+#the generated cards of fixtures.py, or `--check <folder>` on saved pages.
+import argparse
+import os
+
+from .fastpath import FAST_FIELDS, FastPathBackend, take_stats
+from .fieldspec import CONTAINER_CLASS, DEFAULT_FIELDS, FIELDS, css_to_xpath, get_fields
+from .profiling import clock, lap
+
+
+class NoProduct(Exception):
+    """Raised when a document has no product container or lacks a required field."""
+
+
+def check_required(field, value):
+    if value is None and field.required:
+        raise NoProduct(f"No {field.name} found in the product container.")
+    return field.finish(value) if value is not None else ""
+
+
+class Bs4Backend:
+    name = "bs4"
+
+    def __init__(self, fields, features="html.parser"):
+        import soupsieve
+        from bs4 import BeautifulSoup, SoupStrainer
+        self.BeautifulSoup = BeautifulSoup
+        self.features = features
+        # Only the product container and what is inside it is turned into a tree
+        self.strainer = SoupStrainer("div", class_=CONTAINER_CLASS)
+        self.fields = [(field, soupsieve.compile(field.selector)) for field in fields]
+
+    def parse(self, html_doc, timings=None):
+        """Returns the field values of the product in `html_doc`.
+
+        With a `timings` dict the tree building and every field are timed into it, see profiling.py.
+        """
+        start = clock(timings)
+        soup = self.BeautifulSoup(html_doc, self.features, parse_only=self.strainer)
+
+        # Locate the main product container
+        product_div = soup.find("div", class_=CONTAINER_CLASS)
+        start = lap(timings, "tree", start)
+        if not product_div:
+            raise NoProduct("No product container found.")
+        values = []
+        for field, selector in self.fields:
+            tag = selector.select_one(product_div)
+            if tag is None:
+                value = None
+            elif field.attr:
+                value = tag.get(field.attr)
+            else:
+                value = tag.get_text(strip=field.strip)
+            values.append(check_required(field, value))
+            start = lap(timings, field.name, start)
+        return tuple(values)
+
+
+class LxmlBackend:
+    name = "lxml"
+
+    def __init__(self, fields):
+        import lxml.html
+        from lxml import etree
+        self.fromstring = lxml.html.fromstring
+        self.find_container = etree.XPath(css_to_xpath(f"div.{CONTAINER_CLASS}").replace("descendant::", "descendant-or-self::", 1))
+        self.fields = [(field, etree.XPath(css_to_xpath(field.selector))) for field in fields]
+
+    def parse(self, html_doc, timings=None):
+        """Returns the field values of the product in `html_doc`."""
+        start = clock(timings)
+        containers = self.find_container(self.fromstring(html_doc))
+        start = lap(timings, "tree", start)
+        if not containers:
+            raise NoProduct("No product container found.")
+        values = []
+        for field, find in self.fields:
+            found = find(containers[0])
+            if not found:
+                value = None
+            elif field.attr:
+                value = found[0].get(field.attr)
+            elif field.strip:
+                value = "".join(text.strip() for text in found[0].itertext())
+            else:
+                value = "".join(found[0].itertext())
+            values.append(check_required(field, value))
+            start = lap(timings, field.name, start)
+        return tuple(values)
+
+
+class SelectolaxBackend:
+    name = "selectolax"
+
+    def __init__(self, fields):
+        from selectolax.lexbor import LexborHTMLParser
+        self.HTMLParser = LexborHTMLParser
+        self.fields = fields
+
+    def parse(self, html_doc, timings=None):
+        """Returns the field values of the product in `html_doc`."""
+        start = clock(timings)
+        container = self.HTMLParser(html_doc).css_first(f"div.{CONTAINER_CLASS}")
+        start = lap(timings, "tree", start)
+        if container is None:
+            raise NoProduct("No product container found.")
+        values = []
+        for field in self.fields:
+            node = container.css_first(field.selector)
+            if node is None:
+                value = None
+            elif field.attr:
+                value = node.attributes.get(field.attr)
+            else:
+                value = node.text(deep=True, strip=field.strip)
+            values.append(check_required(field, value))
+            start = lap(timings, field.name, start)
+        return tuple(values)
+
+
+BACKENDS = {"bs4": Bs4Backend, "lxml": LxmlBackend, "selectolax": SelectolaxBackend}
+FAST_SUFFIX = "+fast"
+loaded = {}
+
+
+def get_backend(name, fields=DEFAULT_FIELDS):
+    """Returns the backend called `name` compiled for `fields`, creating it once per process.
+
+    A name ending in "+fast", e.g. "lxml+fast", puts the regular expressions of
+    fastpath.py in front of the backend; it is only used when they do not match.
+    """
+    base = name[:-len(FAST_SUFFIX)] if name.endswith(FAST_SUFFIX) else name
+    if base not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {name!r}, choose from {', '.join(BACKENDS)}")
+    key = (name, tuple(fields))
+    if key not in loaded:
+        if base != name:
+            loaded[key] = FastPathBackend(get_backend(base, fields), fields)
+            return loaded[key]
+        try:
+            loaded[key] = BACKENDS[name](get_fields(fields))
+        except ImportError as e:
+            raise ImportError(f"The {name} parser backend needs the {name} package: {e}") from e
+    return loaded[key]
+
+
+def check_backends(documents, names=tuple(BACKENDS), reference="bs4", fields=DEFAULT_FIELDS):
+    """Parses every (name, html) with each backend and returns the documents where they differ."""
+    backends = [get_backend(name, fields) for name in names]
+    base = get_backend(reference, fields)
+    mismatches = []
+    for doc_name, html_doc in documents:
+        expected = outcome(base, html_doc)
+        for backend in backends:
+            got = outcome(backend, html_doc)
+            if got != expected:
+                mismatches.append((doc_name, backend.name, expected, got))
+    return mismatches
+
+
+def outcome(backend, html_doc):
+    """Returns what a backend makes of a document, with failures reduced to their kind."""
+    try:
+        return backend.parse(html_doc)
+    except NoProduct:
+        return "no product"
+    except Exception:
+        return "error"
+
+
+if __name__ == "__main__":
+    from fixtures import fixture_documents
+    from .collect import iter_documents
+
+    parser = argparse.ArgumentParser(description="Checks that every parser backend gives the bs4 output on a corpus.")
+    parser.add_argument("--check", help="folder of .html files and/or a snapshots store to check on; generated fixture cards by default")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--fields", nargs="+", help="fields to compare, see fieldspec.py; every field by default, or the fast path fields with --fast-path")
+    parser.add_argument("--fast-path", action="store_true", help="also check each backend behind the regex fast path of fastpath.py")
+    args = parser.parse_args()
+    if args.fields is None:
+        args.fields = list(FAST_FIELDS if args.fast_path else FIELDS)
+    elif args.fast_path and not set(args.fields) <= set(FAST_FIELDS):
+        #With any other field every card would fall back, and the fast path would not be checked at all.
+        parser.error(f"--fast-path can only check {', '.join(FAST_FIELDS)}")
+
+    if args.check:
+        documents = list(iter_documents(args.check, os.path.join(args.check, "snapshots")))
+    else:
+        documents = fixture_documents()
+    names = args.backends + [name + FAST_SUFFIX for name in args.backends] if args.fast_path else args.backends
+    mismatches = check_backends(documents, names, fields=args.fields)
+    for doc_name, backend, expected, got in mismatches[:20]:
+        print(f"{doc_name}: {backend} gave {got!r}, bs4 gave {expected!r}")
+    print(f"{len(documents)} documents, {len(mismatches)} mismatches")
+    if args.fast_path:
+        counts = take_stats()
+        print(f"Fast path: {counts['fast']} parses, {counts['fallback']} fell back to the DOM")
+    raise SystemExit(1 if mismatches else 0)
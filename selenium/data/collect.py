@@ -1,51 +1,347 @@
+import argparse
+import csv
 import os
-from bs4 import BeautifulSoup
-import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-d = {'title': [], 'price': [], 'link': []}
+from http_fetch import cards_from_html
+
+from .backends import BACKENDS, FAST_SUFFIX, NoProduct, get_backend
+from .fastpath import add_stats, fallback_rate, take_stats
+from .dedupe import unique_rows
+from .fieldspec import CARD_CLASS, CRAWLED_AT, DEFAULT_FIELDS, FIELDS
+from .history import PriceHistory
+from .search import TitleIndex
+from .columnar import FORMATS, write_columnar
+from .manifest import Manifest, content_hash
+from .profiling import ParseProfile, Profiler, Progress, clock, lap
+from .snapshot_store import SnapshotStore
 
 # Path to the folder containing the HTML files
 folder_path = "data"
+# Snapshot store written by project.py
+store_path = os.path.join(folder_path, "snapshots")
 
-# Loop through all files in the folder
-for filename in os.listdir(folder_path):
-    file_path = os.path.join(folder_path, filename)
-    
-    # Only process files with .html extension
-    if os.path.isfile(file_path) and filename.endswith(".html"):
-        print(f"Processing file: {filename}")
-        try:
+
+def iter_documents(folder_path, store_path):
+    """Yields (name, html) for loose .html files and then every record in the snapshot store.
+
+    A loose file holding a whole search page, like a fixture page, is yielded
+    card by card as "<file>#<position>".
+    """
+    # Loop through all files in the folder
+    for filename in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, filename)
+
+        # Only process files with .html extension
+        if os.path.isfile(file_path) and filename.endswith(".html"):
             with open(file_path, "r", encoding="utf-8") as file:
                 html_doc = file.read()
-            soup = BeautifulSoup(html_doc, "html.parser")
-
-            # Locate the main product container
-            product_div = soup.find("div", class_="tUxRFH")
-            if product_div:
-                # Extract the <a> tag containing the title and link
-                link_tag = product_div.find("a", class_="CGtC98")
-                if link_tag:
-                    title = link_tag.find("div", class_="KzDlHZ").get_text(strip=True)  # Product title
-                    link = "https://www.flipkart.com" + link_tag["href"]  # Product link
-                    print("Title:", title)
-                    print("Link:", link)
-                else:
-                    print("No link tag found in the product container.")
+            cards = cards_from_html(html_doc, CARD_CLASS)
+            if len(cards) > 1:
+                for position, card in enumerate(cards, 1):
+                    yield f"{filename}#{position}", card
             else:
-                print("No product container found.")
-            
+                yield filename, html_doc
+
+    # Stream the snapshot store shard by shard, then the per-query stores written by scheduler.py
+    if os.path.isdir(store_path):
+        with SnapshotStore(store_path) as store:
+            yield from store.iter_records()
+        for name in sorted(os.listdir(store_path)):
+            query_path = os.path.join(store_path, name)
+            if os.path.isdir(query_path):
+                with SnapshotStore(query_path) as store:
+                    yield from store.iter_records()
+
+
+def iter_stores(store_path):
+    """Yields the snapshot store and the per-query stores written by scheduler.py, opened."""
+    if os.path.isdir(store_path):
+        with SnapshotStore(store_path) as store:
+            yield store
+        for name in sorted(os.listdir(store_path)):
+            query_path = os.path.join(store_path, name)
+            if os.path.isdir(query_path):
+                with SnapshotStore(query_path) as store:
+                    yield store
+
+
+def iter_inputs(folder_path, store_path):
+    """Yields (input id, info, load, crawled_at) for every input without reading it.
 
+    `info` holds what identifies this version of the input: size and mtime of
+    a loose file, or the position of a store record. `load()` reads it.
+    `crawled_at` is when it was crawled in unix seconds: the crawl time of a
+    store record, or the newest mtime of the loose files or of a store index
+    written before crawl times were recorded. Loose files come from one legacy
+    crawl, so they all share the same time instead of each being a crawl.
+    """
+    loose = []
+    for filename in sorted(os.listdir(folder_path)):
+        file_path = os.path.join(folder_path, filename)
+        if os.path.isfile(file_path) and filename.endswith(".html"):
+            loose.append((file_path, os.stat(file_path)))
+    if loose:
+        crawled_at = int(max(stat.st_mtime for _, stat in loose))
+        for file_path, stat in loose:
+            yield file_path, {"size": stat.st_size, "mtime": stat.st_mtime_ns}, lambda file_path=file_path: read_file(file_path), crawled_at
+    for store in iter_stores(store_path):
+        written = int(os.path.getmtime(os.path.join(store.path, "index.tsv")))
+        for key, location in store.locations():
+            crawled_at = store.crawled_at(key)
+            yield f"{store.path}#{key}", {"size": location[2], "location": list(location)}, lambda store=store, key=key: store.get(key), written if crawled_at is None else crawled_at
 
-            p = soup.find(attrs={"class" : 'Nx9bqj _4b5DiR'})
-            price = (p.get_text())
-            d['title'].append(title)
-            d['link'].append(link)
-            d['price'].append(price)
-        except Exception as e:
+
+def read_file(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def parse_product(html_doc, verbose=True, backend="bs4", fields=DEFAULT_FIELDS, timings=None, quiet=False):
+    """Returns the values of `fields` for one saved product card, or None if it has no product.
+
+    `timings` collects the time spent per stage, see profiling.py; `quiet` drops the message for cards without a product.
+    """
+    try:
+        row = get_backend(backend, fields).parse(html_doc, timings)
+    except NoProduct as e:
+        if not quiet:
             print(e)
+        return None
+    if verbose:
+        for name, value in zip(fields, row):
+            print(f"{name.capitalize()}:", value)
+    return row
+
+
+def parse_document(filename, html_doc, verbose=False, backend="bs4", fields=DEFAULT_FIELDS, profile=None, quiet=False):
+    """Returns the list of rows (zero or one) parsed from one document.
+
+    With a `profile` (a ParseProfile) the document's stage timings are added to it.
+    """
+    if verbose:
+        print(f"Processing file: {filename}")
+    timings = {} if profile is not None else None
+    try:
+        row = parse_product(html_doc, verbose, backend, fields, timings, quiet)
+        return [row] if row else []
+    except Exception as e:
+        print(f"{filename}: {e}")
+        return []
+    finally:
+        if profile is not None:
+            profile.add(timings)
+
+
+def parse_documents(documents, verbose=False, backend="bs4", fields=DEFAULT_FIELDS, profile=None, quiet=False):
+    """Parses (name, html) pairs one at a time and yields each one's rows in the same order."""
+    for filename, html_doc in documents:
+        yield parse_document(filename, html_doc, verbose, backend, fields, profile, quiet)
+
+
+def parse_chunk(chunk, verbose=False, backend="bs4", fields=DEFAULT_FIELDS, quiet=False):
+    """Parses a list of (name, html) and returns each one's rows in the same order.
+
+    Also returns the worker's fast path counts for the chunk, see fastpath.py.
+    """
+    take_stats()
+    return [parse_document(filename, html_doc, verbose, backend, fields, quiet=quiet) for filename, html_doc in chunk], take_stats()
+
+
+def chunked(documents, size):
+    """Groups documents into lists of `size`."""
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_rows(rows, path="data.csv", batch_size=1000, fields=DEFAULT_FIELDS):
+    """Streams rows into a CSV file, flushing every `batch_size` rows.
+
+    Only one batch is held in memory at a time and every flushed batch is
+    complete, so an interrupted run still leaves a readable file. The layout is
+    the same as the DataFrame.to_csv output this replaces.
+    """
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["", *fields])
+        batch = []
+        try:
+            for row in rows:
+                batch.append((count, *row))
+                count += 1
+                if len(batch) >= batch_size:
+                    writer.writerows(batch)
+                    f.flush()
+                    batch = []
+        finally:
+            writer.writerows(batch)
+            f.flush()
+    return count
+
+
+def parse_parallel(documents, workers, chunk_size, backend="bs4", fields=DEFAULT_FIELDS, quiet=False):
+    """Parses chunks of documents on a pool of processes and yields each one's rows in input order.
+
+    Only a few chunks per worker are in flight at a time, so the documents are
+    still streamed instead of all being read into memory first. Finished chunks
+    are yielded as soon as every chunk before them is done, not only when the
+    window is full, so rows keep coming when documents arrive slowly.
+    """
+    def results(future):
+        rows, counts = future.result()
+        add_stats(counts)
+        return rows
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = deque()
+        for chunk in chunked(documents, chunk_size):
+            window.append(executor.submit(parse_chunk, chunk, False, backend, fields, quiet))
+            if len(window) >= workers * 2:
+                yield from results(window.popleft())
+            while window and window[0].done():
+                yield from results(window.popleft())
+        while window:
+            yield from results(window.popleft())
+
+
+def parse(documents, workers, chunk_size, backend, fields=DEFAULT_FIELDS, profile=None, quiet=False):
+    """Parses documents serially or on `workers` processes, yielding each one's rows in order.
+
+    A `profile` can only time this process, so profiling always parses serially.
+    """
+    if workers > 1 and profile is None:
+        return parse_parallel(documents, workers, chunk_size, backend, fields, quiet)
+    return parse_documents(documents, not quiet, backend, fields, profile, quiet)
+
+
+def collect_incremental(manifest, workers, chunk_size, backend, fields=DEFAULT_FIELDS, profile=None, progress=None):
+    """Parses only new or changed inputs and yields the rows of every input in order.
+
+    Every row ends with the crawl time of its input (the CRAWLED_AT column).
+    Unchanged inputs reuse the rows stored in the manifest; the manifest is
+    updated with the rows of everything that was parsed. Rows are yielded as
+    soon as every input before them is done, so the output still streams.
+    With a `profile` reading and parsing are timed; with a `progress` line the
+    per-file prints are replaced by it.
+    """
+    waiting = deque()
+    pending = deque()
+    stats = {"inputs": 0, "reused": 0, "parsed": 0}
+
+    def changed_documents():
+        for input_id, info, load, crawled_at in iter_inputs(folder_path, store_path):
+            stats["inputs"] += 1
+            waiting.append((input_id, crawled_at))
+            if manifest.unchanged(input_id, info):
+                stats["reused"] += 1
+                continue
+            timings = {} if profile is not None else None
+            start = clock(timings)
+            html_doc = load()
+            lap(timings, "read", start)
+            if profile is not None:
+                profile.add(timings, new_input=False)
+            digest = content_hash(html_doc)
+            same = manifest.same_content(digest)
+            if same is not None:
+                #Same content under a new size/mtime or location, e.g. a touched file.
+                manifest.record(input_id, info, digest, same)
+                stats["reused"] += 1
+                continue
+            stats["parsed"] += 1
+            pending.append((input_id, info, digest))
+            yield input_id, html_doc
+
+    def ready_rows(limit=None):
+        while waiting and waiting[0][0] != limit:
+            input_id, crawled_at = waiting.popleft()
+            for row in manifest.rows(input_id):
+                yield (*row, crawled_at)
 
-df = pd.DataFrame(data = d)
-df.to_csv("data.csv")
+    for rows in parse(changed_documents(), workers, chunk_size, backend, fields, profile, progress is not None):
+        input_id, info, digest = pending.popleft()
+        manifest.record(input_id, info, digest, rows)
+        if progress is not None:
+            progress.update(stats["inputs"], f"{stats['parsed']} parsed, {stats['reused']} unchanged")
+        #Everything up to the next input still being parsed can be written.
+        yield from ready_rows(pending[0][0] if pending else None)
+    yield from ready_rows()
+    manifest.forget_missing()
+    if progress is not None:
+        progress.finish(stats["inputs"])
+    print(f"{stats['parsed']} inputs parsed, {stats['reused']} unchanged")
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collects title, price and link of every saved product into data.csv.")
+    parser.add_argument("--workers", type=int, default=1, help="processes parsing in parallel; 0 uses every core")
+    parser.add_argument("--chunk-size", type=int, default=200, help="documents handed to a worker at a time")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows written to data.csv at a time")
+    parser.add_argument("--format", choices=("csv",) + FORMATS, default="csv", help="csv, or typed columns with integer prices")
+    parser.add_argument("--output", help="output file, data.csv/data.parquet/data.arrow by default")
+    parser.add_argument("--parser", choices=list(BACKENDS), default="bs4", help="HTML parser backend, see backends.py")
+    parser.add_argument("--fields", nargs="+", choices=list(FIELDS), default=list(DEFAULT_FIELDS), help="columns to extract, see fieldspec.py")
+    parser.add_argument("--fast-path", action="store_true", help="read title/price/link with regular expressions, falling back to --parser, see fastpath.py")
+    parser.add_argument("--manifest", default=os.path.join(folder_path, "manifest.sqlite"), help="SQLite record of parsed inputs; only new or changed ones are parsed again")
+    parser.add_argument("--full", action="store_true", help="parse every input again and rebuild the manifest")
+    parser.add_argument("--dedupe", action="store_true", help="keep only the first row of every product, by canonical link")
+    parser.add_argument("--history", help="also record the prices in this SQLite price history, see history.py")
+    parser.add_argument("--search", help="also add the titles to this full-text index, see search.py")
+    parser.add_argument("--quiet", action="store_true", help="show one progress line instead of every product")
+    parser.add_argument("--profile", action="store_true", help="time reading, tree building and every field per input and print histograms; parses every input serially, like --full")
+    parser.add_argument("--pstats", help="also run under cProfile and dump the stats to this file")
+    parser.add_argument("--profile-json", help="profile like --profile and also write the stage summary to this JSON file")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count()
+    profile = ParseProfile() if args.profile or args.pstats or args.profile_json else None
+    if workers > 1 and profile is not None:
+        print("Profiling parses in this process only, ignoring --workers")
+    elif workers > 1:
+        print(f"Parsing with {workers} processes")
+    backend = args.parser + FAST_SUFFIX if args.fast_path else args.parser
 
+    #Rows are only reused when they were parsed with the same backend and fields.
+    #A profile of only the changed inputs would be empty on a re-run, so profiling parses everything like --full.
+    manifest = Manifest(args.manifest, f"{backend}:{','.join(args.fields)}", full=args.full or profile is not None)
+    rows = collect_incremental(manifest, workers, args.chunk_size, backend, args.fields, profile, Progress() if args.quiet else None)
+    timed_fields = [*args.fields, CRAWLED_AT]
+    if args.dedupe:
+        rows = unique_rows(rows, timed_fields)
+    history = PriceHistory(args.history) if args.history else None
+    if history is not None:
+        #One observation per product for the crawl each snapshot came from.
+        rows = history.recording(rows, fields=timed_fields, batch_size=args.batch_size)
+    index = TitleIndex(args.search) if args.search else None
+    if index is not None:
+        rows = index.indexing(rows, timed_fields, args.batch_size)
+    with Profiler(args.pstats):
+        if args.format == "csv":
+            output = args.output or "data.csv"
+            count = write_rows((row[:-1] for row in rows), output, args.batch_size, args.fields)
+        else:
+            output = args.output or f"data.{args.format}"
+            #Every row keeps the time of the crawl its snapshot came from.
+            count = write_columnar(rows, output, args.format, args.batch_size, fields=timed_fields)
+    print(f"Wrote {count} rows to {output}")
+    manifest.close()
+    if history is not None:
+        history.close()
+        print(f"Recorded {count} prices in {args.history}")
+    if index is not None:
+        print(f"{len(index)} products in the title index {args.search}")
+        index.close()
+    if profile is not None:
+        profile.report()
+    if args.profile_json:
+        profile.dump(args.profile_json)
+    if args.fast_path:
+        counts = take_stats()
+        print(f"Fast path: {counts['fast']} parsed, {counts['fallback']} fell back to {args.parser} ({fallback_rate(counts):.1%})")
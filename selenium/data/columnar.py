@@ -0,0 +1,109 @@
+#Writes collected rows as typed columns to Parquet or Arrow IPC instead of CSV.
+#
+#    title       dictionary-encoded string
+#    price       int64 rupees, parsed from text like "₹12,999" (null if there are no digits)
+#    link        string
+#    ...         any other field of fieldspec.py as a string
+#    crawled_at  timestamp of the crawl each row's snapshot came from (UTC)
+#
+#Prices are normalized a whole batch at a time with pyarrow.compute. pyarrow is
+#optional and only imported when a columnar format is asked for.
+import datetime
+
+from .fieldspec import CRAWLED_AT, DEFAULT_FIELDS
+
+FORMATS = ("parquet", "arrow")
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(f"Parquet/Arrow output needs the pyarrow package: {e}") from e
+    return pyarrow
+
+
+def schema(pa, fields=DEFAULT_FIELDS):
+    """Returns the table schema: typed title/price/link, any other field as a string, then crawled_at."""
+    types = {
+        "title": pa.dictionary(pa.int32(), pa.string()),
+        "price": pa.int64(),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in fields if name != CRAWLED_AT] + [(CRAWLED_AT, pa.timestamp("s", tz="UTC"))])
+
+
+def normalize_prices(pa, prices):
+    """Turns an array of price texts into int64 rupees, vectorized over the whole array."""
+    digits = pa.compute.replace_substring_regex(prices, pattern=r"[^0-9]", replacement="")
+    digits = pa.compute.if_else(pa.compute.equal(digits, ""), pa.scalar(None, pa.string()), digits)
+    return pa.compute.cast(digits, pa.int64())
+
+
+def make_batch(pa, rows, crawled_at, fields=DEFAULT_FIELDS):
+    """Builds one record batch from rows holding the values of `fields`.
+
+    Rows whose fields include CRAWLED_AT (unix seconds) keep their own crawl
+    time; otherwise every row gets `crawled_at`.
+    """
+    columns = []
+    times = [crawled_at] * len(rows)
+    for name, values in zip(fields, zip(*rows)):
+        if name == CRAWLED_AT:
+            times = [datetime.datetime.fromtimestamp(value, datetime.timezone.utc) for value in values]
+            continue
+        column = pa.array(values, pa.string())
+        if name == "title":
+            column = column.dictionary_encode()
+        elif name == "price":
+            column = normalize_prices(pa, column)
+        columns.append(column)
+    columns.append(pa.array(times, pa.timestamp("s", tz="UTC")))
+    return pa.record_batch(columns, schema=schema(pa, fields))
+
+
+def write_columnar(rows, path, fmt="parquet", batch_size=1000, crawled_at=None, fields=DEFAULT_FIELDS):
+    """Streams rows into a Parquet file or an Arrow IPC stream, one batch at a time.
+
+    The crawled_at column comes from the rows when `fields` includes
+    CRAWLED_AT, and is `crawled_at` (now by default) for every row otherwise.
+    Returns the number of rows written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown columnar format {fmt!r}, choose from {', '.join(FORMATS)}")
+    pa = import_pyarrow()
+    if crawled_at is None:
+        crawled_at = datetime.datetime.now(datetime.timezone.utc)
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(path, schema(pa, fields), compression="zstd")
+        write = writer.write_batch
+    else:
+        #The stream format allows every batch to carry its own title dictionary.
+        writer = pa.ipc.new_stream(path, schema(pa, fields), options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        write = writer.write_batch
+    count = 0
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write(make_batch(pa, batch, crawled_at, fields))
+                count += len(batch)
+                batch = []
+        if batch:
+            write(make_batch(pa, batch, crawled_at, fields))
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def read_columnar(path):
+    """Reads a file written by write_columnar() back as a pyarrow Table."""
+    pa = import_pyarrow()
+    if path.endswith(".parquet"):
+        return pa.parquet.read_table(path)
+    with pa.ipc.open_stream(path) as reader:
+        return reader.read_all()
@@ -0,0 +1,115 @@
+#Index of products already seen, keyed by their canonical link, so repeated
+#cards can be skipped in O(1) by the crawler and by collect.py.
+#
+#Search results repeat products across pages and queries, each time with
+#different tracking parameters (lid, otracker, srno, ...). The canonical link
+#keeps only the path and pid, so every copy of a product has the same key.
+#page_cache.py keys search pages with the same canonical_url, keeping their
+#other parameters.
+#
+#The index is a set in memory backed by an append-only text file with one key
+#per line. Adding a key appends it; opening the index reads the file back.
+#A line cut short by a crash is ignored.
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .fieldspec import BASE_URL
+
+#Query parameters that only track where a click came from and never change the page.
+TRACKING_PARAMS = ("otracker", "otracker1", "fm", "iid", "ssid", "qh", "ppt", "ppn", "srno", "lid")
+#The one parameter telling products apart; q, marketplace and store depend on the listing.
+PRODUCT_PARAMS = ("pid",)
+
+
+def canonical_url(url, keep=None):
+    """Normalizes a URL so every copy of the same page has the same key.
+
+    Tracking parameters are dropped and the others sorted; with `keep` only
+    the parameters named in it are left. Links without a host are on BASE_URL.
+    """
+    base = urlsplit(BASE_URL)
+    parts = urlsplit(url.strip())
+    params = [
+        (name.strip(), value.strip())
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.strip().lower() not in TRACKING_PARAMS and (keep is None or name.strip() in keep)
+    ]
+    scheme = (parts.scheme or base.scheme).lower()
+    netloc = (parts.netloc or base.netloc).lower()
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(sorted(params)), ""))
+
+
+def canonical_link(link):
+    """Reduces a product link to its path and pid, dropping the parameters every listing adds."""
+    return canonical_url(link, keep=PRODUCT_PARAMS)
+
+
+class SeenIndex:
+    """Set of keys, optionally persisted to `path`."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.keys = set()
+        self.file = None
+        if path:
+            if os.path.exists(path):
+                line = "\n"
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if line.endswith("\n"):
+                            self.keys.add(line[:-1])
+                if not line.endswith("\n"):
+                    #Drops the cut-short line so the next key starts on a line of its own.
+                    with open(path, "r+b") as f:
+                        f.truncate(os.path.getsize(path) - len(line.encode("utf-8")))
+            self.file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, key):
+        """Returns True and remembers `key` the first time it is seen."""
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        if self.file:
+            self.file.write(key + "\n")
+        return True
+
+    def flush(self):
+        """Makes every added key durable."""
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def unique_rows(rows, fields, seen=None):
+    """Yields only the first row of every product, going by the canonical link.
+
+    Rows hold the values of `fields`, which must include link. `seen` is a
+    SeenIndex to share between runs; by default the rows are only compared
+    with each other.
+    """
+    if "link" not in fields:
+        raise ValueError("Deduplicating rows needs the link field")
+    link_at = fields.index("link")
+    if seen is None:
+        seen = SeenIndex()
+    for row in rows:
+        if seen.add(canonical_link(row[link_at])):
+            yield row
@@ -0,0 +1,122 @@
+#Reads title, price and link straight out of the card markup with precompiled
+#regular expressions, and only builds a DOM when they do not match.
+#
+#The cards saved by project.py have a very regular shape:
+#
+#    <div class="tUxRFH" ...><a class="CGtC98" href="..." ...> ... <div class="KzDlHZ">title</div>
+#    ... <div class="Nx9bqj _4b5DiR">&#8377;12,999</div> ...
+#
+#The patterns only accept that exact shape (class attributes with exactly those
+#classes, plain text inside the title and price divs), and only inside the
+#container, whose end is found by counting div tags. Anything else, e.g. a title
+#containing markup or a container whose end cannot be found, falls back to the
+#DOM backend, so both paths give the same rows. `stats` counts how often each
+#path was taken.
+import re
+from html import unescape
+
+from .fieldspec import absolute_link
+from .profiling import clock, lap
+
+CONTAINER = re.compile(r'<div class="tUxRFH"[\s>]')
+LINK = re.compile(r'<a\b[^>]*?\bclass="CGtC98"[^>]*?\bhref="([^"]*)"|<a\b[^>]*?\bhref="([^"]*)"[^>]*?\bclass="CGtC98"')
+LINK_END = re.compile(r"</a>")
+TITLE = re.compile(r'<div class="KzDlHZ">([^<]*)</div>')
+PRICE = re.compile(r'<div class="Nx9bqj _4b5DiR">([^<]*)</div>')
+DIV_TAG = re.compile(r"<(/?)div\b[^>]*>")
+#Markup in which a div tag might not be an element, so counting them cannot find the container's end.
+OPAQUE = re.compile(r"<!--|<script\b|<style\b|<template\b|<textarea\b", re.IGNORECASE)
+
+#Fields the fast path knows how to read.
+FAST_FIELDS = ("title", "price", "link")
+
+stats = {"fast": 0, "fallback": 0}
+
+
+def first_use(html_doc, class_name, start, match):
+    """Returns True if `match` holds the first mention of `class_name` after `start`.
+
+    An earlier element with that class plus others would be what the DOM
+    selector picks, so the pattern's match would not be the same element.
+    """
+    return html_doc.find(class_name, start) == match.start() + match.group(0).find(class_name)
+
+
+def container_end(html_doc, start):
+    """Returns where the div opened at `start` is closed, or None if that cannot be told from the div tags."""
+    depth = 0
+    for tag in DIV_TAG.finditer(html_doc, start):
+        if tag.group(0).endswith("/>"):
+            return None
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = tag.start()
+            return None if OPAQUE.search(html_doc, start, end) else end
+    return None
+
+
+def extract(html_doc):
+    """Returns {"title", "price", "link"} read with the patterns, or None if any of them does not match."""
+    container = CONTAINER.search(html_doc)
+    if not container or not first_use(html_doc, "tUxRFH", 0, container):
+        return None
+    #Every field is looked up inside the container only, like the DOM backends do.
+    end = container_end(html_doc, container.start())
+    if end is None:
+        return None
+    link = LINK.search(html_doc, container.start(), end)
+    if not link or not first_use(html_doc, "CGtC98", container.start(), link):
+        return None
+    link_end = LINK_END.search(html_doc, link.end(), end)
+    title = TITLE.search(html_doc, link.end(), end)
+    #The title has to be inside the link, as the DOM selector "a.CGtC98 div.KzDlHZ" requires.
+    if not title or not link_end or title.start() > link_end.start() or not first_use(html_doc, "KzDlHZ", link.end(), title):
+        return None
+    price = PRICE.search(html_doc, container.start(), end)
+    if not price or not first_use(html_doc, "Nx9bqj", container.start(), price):
+        return None
+    return {
+        "title": unescape(title.group(1)).strip(),
+        "price": unescape(price.group(1)),
+        "link": absolute_link(unescape(link.group(1) if link.group(1) is not None else link.group(2))),
+    }
+
+
+class FastPathBackend:
+    """Wraps a DOM backend and tries the regular expressions first."""
+
+    def __init__(self, dom, fields):
+        self.dom = dom
+        self.name = f"{dom.name}+fast"
+        self.fields = tuple(fields)
+        self.usable = all(name in FAST_FIELDS for name in self.fields)
+
+    def parse(self, html_doc, timings=None):
+        """Returns the field values of the product in `html_doc`."""
+        if self.usable:
+            start = clock(timings)
+            values = extract(html_doc)
+            lap(timings, "fast", start)
+            if values is not None:
+                stats["fast"] += 1
+                return tuple(values[name] for name in self.fields)
+        stats["fallback"] += 1
+        return self.dom.parse(html_doc, timings)
+
+
+def take_stats():
+    """Returns the counts since the last call and resets them."""
+    taken = dict(stats)
+    stats["fast"] = stats["fallback"] = 0
+    return taken
+
+
+def add_stats(counts):
+    """Adds counts taken in another process, e.g. a collect.py worker."""
+    for name, value in counts.items():
+        stats[name] += value
+
+
+def fallback_rate(counts):
+    total = counts["fast"] + counts["fallback"]
+    return counts["fallback"] / total if total else 0.0
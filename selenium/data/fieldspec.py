@@ -0,0 +1,74 @@
+#Declarative description of the fields read from a Flipkart product card.
+#
+#Each field is a CSS selector evaluated inside the product container
+#(div.tUxRFH) plus how to turn the matched element into a string. The parser
+#backends compile the selectors once per run and only ever search the
+#container's subtree, so adding a field costs one small lookup per card
+#instead of another search of the whole document.
+BASE_URL = "https://www.flipkart.com"
+
+#The element around each search result; the crawler saves one per product.
+CARD_CLASS = "_75nlfW"
+#Every field is looked up inside this element; a card without it has no product.
+CONTAINER_CLASS = "tUxRFH"
+
+
+def absolute_link(href):
+    return BASE_URL + href
+
+
+class Field:
+    """One output column: where to find it in the container and how to read it.
+
+    `attr` reads an attribute instead of the text, `strip` strips every text
+    piece (like get_text(strip=True)), `post` post-processes the value, and a
+    missing `required` field means the card has no product.
+    """
+
+    def __init__(self, name, selector, attr=None, strip=False, post=None, required=True):
+        self.name = name
+        self.selector = selector
+        self.attr = attr
+        self.strip = strip
+        self.post = post
+        self.required = required
+
+    def finish(self, value):
+        """Applies the post-processing to an extracted value."""
+        if value is None:
+            return None
+        return self.post(value) if self.post else value
+
+
+FIELDS = {
+    "title": Field("title", "a.CGtC98 div.KzDlHZ", strip=True),
+    "price": Field("price", ".Nx9bqj._4b5DiR"),
+    "link": Field("link", "a.CGtC98", attr="href", post=absolute_link),
+    "rating": Field("rating", "div.XQDdHH", strip=True, required=False),
+    "discount": Field("discount", "div.UkUFwK", strip=True, required=False),
+}
+
+#Columns of data.csv, in order.
+DEFAULT_FIELDS = ("title", "price", "link")
+
+#Not read from the card: collect.py appends the crawl time of every snapshot
+#(unix seconds) to its rows under this name, after the fields.
+CRAWLED_AT = "crawled_at"
+
+
+def get_fields(names=DEFAULT_FIELDS):
+    """Returns the Field objects for a list of field names."""
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}, choose from {', '.join(FIELDS)}")
+    return [FIELDS[name] for name in names]
+
+
+def css_to_xpath(selector):
+    """Translates the small CSS subset used in FIELDS (tag.class chains and descendant combinators) to XPath."""
+    steps = []
+    for part in selector.split():
+        tag, *classes = part.split(".")
+        tests = " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in classes)
+        steps.append(f"{tag or '*'}[{tests}]" if tests else (tag or "*"))
+    return "descendant::" + "//".join(steps)
@@ -0,0 +1,229 @@
+#Keeps every price collect.py has seen in a SQLite database, one observation
+#per product per crawl, so price changes across crawls can be queried.
+#
+#    products      id, canonical link (unique), latest title
+#    crawls        id, crawled_at (unix seconds, unique)
+#    observations  (product, crawl) primary key, price in whole rupees and its
+#                  change since the product's previous observation
+#
+#Observations are stored clustered by (product, crawl), so the history of one
+#product is a single range scan. The change is worked out when a price is
+#written, against the product's observation in the crawl before it by time, and
+#an index on (crawl, change) hands out the biggest drops of a crawl already
+#sorted, without comparing whole crawls at query time. Writes run in WAL mode, a
+#batch of rows per transaction.
+#
+#Every snapshot carries the time of the crawl that saved it, so collect.py
+#--history files each price under its own crawl. The crawl only saves products
+#it has not seen before, though; project.py, scheduler.py and pipeline.py take
+#--history too and record every card they crawl, known products included.
+#
+#    python -m data.history history https://www.flipkart.com/.../p/itm...?pid=...
+#    python -m data.history drops --limit 20
+import argparse
+import datetime
+import re
+import sqlite3
+
+from .backends import NoProduct, get_backend
+from .dedupe import canonical_link
+from .fieldspec import CRAWLED_AT, DEFAULT_FIELDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    title TEXT
+);
+CREATE TABLE IF NOT EXISTS crawls (
+    id INTEGER PRIMARY KEY,
+    crawled_at INTEGER NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS observations (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    crawl_id INTEGER NOT NULL REFERENCES crawls(id),
+    price INTEGER,
+    change INTEGER,
+    PRIMARY KEY (product_id, crawl_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_change ON observations (crawl_id, change);
+"""
+
+NOT_DIGITS = re.compile(r"[^0-9]")
+
+
+def price_value(text):
+    """Turns a price text like "₹12,999" into 12999, or None if it has no digits."""
+    digits = NOT_DIGITS.sub("", text or "")
+    return int(digits) if digits else None
+
+
+def timestamp(crawled_at):
+    """Returns a datetime or unix seconds, or now when it is None, as unix seconds."""
+    if crawled_at is None:
+        crawled_at = datetime.datetime.now(datetime.timezone.utc)
+    if isinstance(crawled_at, datetime.datetime):
+        return int(crawled_at.timestamp())
+    return int(crawled_at)
+
+
+class PriceHistory:
+    """SQLite store of product prices per crawl."""
+
+    def __init__(self, path="data/history.sqlite"):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        #WAL with synchronous=NORMAL only syncs at checkpoints; a crash loses at most the last transactions.
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def crawl_id(self, crawled_at=None):
+        """Returns the id of the crawl at `crawled_at` (a datetime or unix seconds), adding it the first time.
+
+        Recording the same crawl again, e.g. a re-run of collect.py on the
+        same snapshots, replaces its observations instead of adding a crawl.
+        """
+        at = timestamp(crawled_at)
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO crawls (crawled_at) VALUES (?)", (at,))
+        return self.db.execute("SELECT id FROM crawls WHERE crawled_at = ?", (at,)).fetchone()[0]
+
+    def write_batch(self, batch):
+        """Stores (crawl id, link, title, price) observations in a single transaction."""
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO products (link, title) VALUES (?, ?) ON CONFLICT (link) DO UPDATE SET title = excluded.title",
+                [(link, title) for _, link, title, _ in batch],
+            )
+            observations = [{"link": link, "crawl": crawl, "price": price} for crawl, link, _, price in batch]
+            #Crawls may be recorded out of order, e.g. old snapshots after a newer crawl, so neighbours go by crawl time.
+            self.db.executemany(
+                "INSERT OR REPLACE INTO observations (product_id, crawl_id, price, change) "
+                "SELECT product.id, :crawl, :price, :price - ("
+                "    SELECT observations.price FROM observations JOIN crawls ON crawls.id = observations.crawl_id "
+                "    WHERE observations.product_id = product.id "
+                "    AND crawls.crawled_at < (SELECT crawled_at FROM crawls WHERE id = :crawl) "
+                "    ORDER BY crawls.crawled_at DESC LIMIT 1"
+                ") FROM products AS product WHERE product.link = :link",
+                observations,
+            )
+            #The product's next observation, if any, now changes from this price.
+            self.db.executemany(
+                "UPDATE observations SET change = price - :price "
+                "WHERE product_id = (SELECT id FROM products WHERE link = :link) AND crawl_id = ("
+                "    SELECT observations.crawl_id FROM observations JOIN crawls ON crawls.id = observations.crawl_id "
+                "    WHERE observations.product_id = (SELECT id FROM products WHERE link = :link) "
+                "    AND crawls.crawled_at > (SELECT crawled_at FROM crawls WHERE id = :crawl) "
+                "    ORDER BY crawls.crawled_at LIMIT 1"
+                ")",
+                observations,
+            )
+
+    def recording(self, rows, crawled_at=None, fields=DEFAULT_FIELDS, batch_size=1000):
+        """Passes `rows` through unchanged while storing them as observations.
+
+        Rows hold the values of `fields`, which must include link and price.
+        When `fields` includes CRAWLED_AT every row is filed under the crawl
+        at its own time; otherwise all of them belong to the crawl at
+        `crawled_at`. Every `batch_size` rows are written in one transaction.
+        """
+        if "link" not in fields or "price" not in fields:
+            raise ValueError("The price history needs the link and price fields")
+        link_at, price_at = fields.index("link"), fields.index("price")
+        title_at = fields.index("title") if "title" in fields else None
+        time_at = fields.index(CRAWLED_AT) if CRAWLED_AT in fields else None
+        crawled_at = timestamp(crawled_at)
+        crawls = {}
+        batch = []
+        try:
+            for row in rows:
+                at = timestamp(row[time_at] if time_at is not None else crawled_at)
+                if at not in crawls:
+                    crawls[at] = self.crawl_id(at)
+                title = row[title_at] if title_at is not None else None
+                batch.append((crawls[at], canonical_link(row[link_at]), title, price_value(row[price_at])))
+                if len(batch) >= batch_size:
+                    self.write_batch(batch)
+                    batch = []
+                yield row
+        finally:
+            if batch:
+                self.write_batch(batch)
+
+    def record(self, rows, crawled_at=None, fields=DEFAULT_FIELDS, batch_size=1000):
+        """Stores rows as observations and returns how many there were."""
+        return sum(1 for _ in self.recording(rows, crawled_at, fields, batch_size))
+
+    def record_cards(self, cards, crawled_at=None, backend="bs4"):
+        """Parses crawled product cards and stores their prices as observations of one crawl.
+
+        Returns how many cards had a product.
+        """
+        parser = get_backend(backend)
+        rows = []
+        for card in cards:
+            try:
+                rows.append(parser.parse(card))
+            except NoProduct:
+                continue
+        return self.record(rows, crawled_at)
+
+    def history(self, link):
+        """Returns [(crawled_at, price)] of one product, oldest first."""
+        return self.db.execute(
+            "SELECT crawls.crawled_at, observations.price FROM observations "
+            "JOIN crawls ON crawls.id = observations.crawl_id "
+            "WHERE observations.product_id = (SELECT id FROM products WHERE link = ?) "
+            "ORDER BY crawls.crawled_at",
+            (canonical_link(link),),
+        ).fetchall()
+
+    def latest_crawl(self):
+        """Returns the id of the latest crawl, or None."""
+        latest = self.db.execute("SELECT id FROM crawls ORDER BY crawled_at DESC LIMIT 1").fetchone()
+        return latest[0] if latest else None
+
+    def drops(self, limit=20, crawl=None):
+        """Returns [(link, title, old price, new price)] of the biggest drops in `crawl` (the latest by default).
+
+        A product's old price is the one it had when it was last seen before.
+        """
+        if crawl is None:
+            crawl = self.latest_crawl()
+        return self.db.execute(
+            "SELECT products.link, products.title, observations.price - observations.change, observations.price "
+            "FROM observations JOIN products ON products.id = observations.product_id "
+            "WHERE observations.crawl_id = ? AND observations.change < 0 "
+            "ORDER BY observations.change LIMIT ?",
+            (crawl, limit),
+        ).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Queries the price history recorded by collect.py --history.")
+    parser.add_argument("--db", default="data/history.sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("history", help="prices of one product over every crawl")
+    show.add_argument("link")
+    drops = commands.add_parser("drops", help="biggest price drops in the latest crawl")
+    drops.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with PriceHistory(args.db) as history:
+        if args.command == "history":
+            for crawled_at, price in history.history(args.link):
+                when = datetime.datetime.fromtimestamp(crawled_at, datetime.timezone.utc)
+                print(f"{when:%Y-%m-%d %H:%M}  {price if price is not None else '-':>8}")
+        else:
+            for link, title, old, new in history.drops(args.limit):
+                print(f"{old - new:>8}  {old:>8} -> {new:<8} {title}  {link}")
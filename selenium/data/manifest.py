@@ -0,0 +1,110 @@
+#Remembers which inputs collect.py has parsed and the rows each one produced,
+#so a re-run only parses new or changed snapshots.
+#
+#Every input is keyed by its path (a loose .html file, or "<store>#<key>" for a
+#snapshot store record) and recorded with its size, mtime, content hash and
+#rows. Size and mtime (or the record's position in its shard) are compared
+#first; the content is only read and hashed when they changed.
+#
+#The manifest is a SQLite database, so rows are looked up per input instead of
+#being held in memory, and what was parsed is committed every `commit_every`
+#inputs: an interrupted run keeps its progress. Every run is numbered and stamps
+#the inputs it sees, so inputs that are gone can be dropped at the end.
+import hashlib
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS inputs (
+    id TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    run INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inputs_by_hash ON inputs (hash);
+"""
+
+
+def content_hash(html_doc):
+    return hashlib.sha256(html_doc.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """SQLite manifest of parsed inputs and their rows."""
+
+    def __init__(self, path="data/manifest.sqlite", parser="bs4", full=False, commit_every=500):
+        self.path = path
+        self.parser = parser
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        settings = dict(self.db.execute("SELECT name, value FROM settings"))
+        with self.db:
+            #Rows from another parser backend or field list are not reused.
+            if full or settings.get("parser") != parser:
+                self.db.execute("DELETE FROM inputs")
+            self.run = int(settings.get("run", 0)) + 1
+            self.db.executemany(
+                "INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)",
+                [("parser", parser), ("run", str(self.run))],
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def changed(self):
+        """Counts a write and commits once `commit_every` have piled up."""
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.save()
+
+    def unchanged(self, input_id, info):
+        """Returns True if the input's size and mtime/location still match, marking it as seen by this run."""
+        entry = self.db.execute("SELECT info FROM inputs WHERE id = ?", (input_id,)).fetchone()
+        if entry is None or json.loads(entry[0]) != info:
+            return False
+        self.db.execute("UPDATE inputs SET run = ? WHERE id = ?", (self.run, input_id))
+        self.changed()
+        return True
+
+    def same_content(self, digest):
+        """Returns the rows recorded with the same content hash, e.g. of a file that was only touched, or None."""
+        entry = self.db.execute("SELECT rows FROM inputs WHERE hash = ? LIMIT 1", (digest,)).fetchone()
+        return json.loads(entry[0]) if entry else None
+
+    def record(self, input_id, info, digest, rows):
+        """Stores the rows parsed from an input."""
+        self.db.execute(
+            "INSERT OR REPLACE INTO inputs (id, info, hash, rows, run) VALUES (?, ?, ?, ?, ?)",
+            (input_id, json.dumps(info), digest, json.dumps([list(row) for row in rows]), self.run),
+        )
+        self.changed()
+
+    def rows(self, input_id):
+        """Returns the rows recorded for an input."""
+        return json.loads(self.db.execute("SELECT rows FROM inputs WHERE id = ?", (input_id,)).fetchone()[0])
+
+    def forget_missing(self):
+        """Forgets inputs this run did not see, i.e. that no longer exist."""
+        self.db.execute("DELETE FROM inputs WHERE run != ?", (self.run,))
+        self.save()
+
+    def save(self):
+        """Commits the inputs recorded so far."""
+        self.db.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.save()
+        self.db.close()
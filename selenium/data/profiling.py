@@ -0,0 +1,146 @@
+#Profiling and progress output for collect.py.
+#
+#With --profile every input is timed by stage: "read" (loading the file or
+#store record), "tree" (building the DOM) and one stage per field (running its
+#selector and reading the value). The fast path of fastpath.py shows up as
+#"fast". At the end each stage is reported with its share of the time,
+#percentiles and a histogram over decades from 1µs to 1s. --pstats also runs
+#the parse under cProfile and dumps the stats for `python -m pstats`.
+#--profile-json writes the same summary to a file, which benchmark.py reads.
+#
+#--quiet replaces the per-file prints with one progress line, rewritten at
+#most once a second.
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+from metrics import percentile
+
+#Upper bounds of the histogram buckets, in seconds; the last bucket is everything slower.
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+BUCKET_LABELS = ("<1µs", "<10µs", "<100µs", "<1ms", "<10ms", "<100ms", "<1s", ">=1s")
+
+
+def clock(timings):
+    """Returns the current time if `timings` is being recorded."""
+    return time.perf_counter() if timings is not None else 0.0
+
+
+def lap(timings, stage, start):
+    """Adds the time since `start` to `stage` and returns the current time; does nothing if `timings` is None."""
+    if timings is None:
+        return start
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
+
+def histogram(values):
+    """Counts `values` into BUCKETS."""
+    counts = [0] * (len(BUCKETS) + 1)
+    for value in values:
+        for i, bound in enumerate(BUCKETS):
+            if value < bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+
+class ParseProfile:
+    """Collects the time every input spent in every stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self.inputs = 0
+
+    def add(self, timings, new_input=True):
+        """Records the {stage: seconds} of one input."""
+        for stage, seconds in timings.items():
+            self.stages.setdefault(stage, []).append(seconds)
+        if new_input:
+            self.inputs += 1
+
+    def summary(self):
+        """Returns count, sum, p50/p95/max and histogram of every stage, slowest stage first."""
+        summary = {}
+        for stage, values in self.stages.items():
+            values = sorted(values)
+            summary[stage] = {
+                "count": len(values),
+                "sum": sum(values),
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "max": values[-1],
+                "histogram": histogram(values),
+            }
+        return dict(sorted(summary.items(), key=lambda item: item[1]["sum"], reverse=True))
+
+    def report(self):
+        """Prints the summary as a table followed by the histograms."""
+        summary = self.summary()
+        total = sum(values["sum"] for values in summary.values()) or 1.0
+        print(f"Profile of {self.inputs} inputs:")
+        for stage, values in summary.items():
+            print(f"  {stage:<10} {values['sum']:8.3f}s {values['sum'] / total:6.1%}  "
+                  f"p50 {values['p50'] * 1e6:9.1f}µs  p95 {values['p95'] * 1e6:9.1f}µs  max {values['max'] * 1e6:10.1f}µs")
+        print("  " + " " * 10 + "".join(f"{label:>8}" for label in BUCKET_LABELS))
+        for stage, values in summary.items():
+            print(f"  {stage:<10}" + "".join(f"{count:8d}" for count in values["histogram"]))
+        return summary
+
+    def dump(self, path):
+        """Writes the input count and the summary to `path` as JSON, for benchmark.py."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"inputs": self.inputs, "stages": self.summary()}, f)
+
+
+class Progress:
+    """One status line on stderr, rewritten at most every `interval` seconds."""
+
+    def __init__(self, interval=1.0, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def update(self, done, text="", force=False):
+        """Shows `done` inputs and the rate so far, unless the line was rewritten too recently."""
+        now = time.perf_counter()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed else 0.0
+        self.stream.write(f"\r{done} inputs, {rate:.0f}/s{', ' + text if text else ''}   ")
+        self.stream.flush()
+
+    def finish(self, done, text=""):
+        """Shows the final counts and ends the line."""
+        self.update(done, text, force=True)
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+class Profiler:
+    """Runs code under cProfile and dumps the stats to `path`; does nothing without a path."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.profiler = cProfile.Profile() if path else None
+
+    def __enter__(self):
+        if self.profiler:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path)
+            print(f"cProfile stats written to {self.path}, the top functions by own time:")
+            pstats.Stats(self.path).sort_stats("tottime").print_stats(10)
+        return False
@@ -0,0 +1,151 @@
+#Full-text index over the titles of collected products, with price filters.
+#
+#    python -m data.search "128 GB" --max-price 15000
+#
+#Titles are kept in SQLite: a listings table (canonical link, title, price in
+#whole rupees, indexed by price) and an FTS5 inverted index over the title
+#tokens, ranked with BM25. Titles and queries are tokenized the same way:
+#lower case, and letters and digits split apart, so "128GB", "128 GB" and
+#"128-gb" all become the tokens "128" and "gb". Every query token must appear.
+#
+#The index is built incrementally from the parser output: collect.py --search
+#adds or updates the products of a run, keyed by canonical link, a batch per
+#transaction.
+import argparse
+import re
+import sqlite3
+
+from .dedupe import canonical_link
+from .fieldspec import DEFAULT_FIELDS
+from .history import price_value
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    price INTEGER
+);
+CREATE INDEX IF NOT EXISTS listings_by_price ON listings (price);
+CREATE VIRTUAL TABLE IF NOT EXISTS title_index USING fts5 (tokens, content='', tokenize='unicode61');
+"""
+
+TOKEN = re.compile(r"[^\W\d_]+|\d+")
+
+
+def tokenize(text):
+    """Splits text into lower-case runs of letters and runs of digits."""
+    return TOKEN.findall(text.lower())
+
+
+def match_expression(query):
+    """Turns a search query into an FTS5 expression requiring every token."""
+    return " ".join(f'"{token}"' for token in tokenize(query))
+
+
+class TitleIndex:
+    """Searchable SQLite index of product titles and prices."""
+
+    def __init__(self, path="data/search.sqlite"):
+        self.path = path
+        try:
+            self.db = sqlite3.connect(path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"The title index needs SQLite built with FTS5: {e}") from e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def add_batch(self, batch):
+        """Adds or updates (link, title, price) listings in a single transaction."""
+        with self.db:
+            for link, title, price in batch:
+                old = self.db.execute("SELECT id, title FROM listings WHERE link = ?", (link,)).fetchone()
+                if old is None:
+                    listing = self.db.execute("INSERT INTO listings (link, title, price) VALUES (?, ?, ?)", (link, title, price)).lastrowid
+                else:
+                    listing, old_title = old
+                    self.db.execute("UPDATE listings SET title = ?, price = ? WHERE id = ?", (title, price, listing))
+                    if old_title == title:
+                        continue
+                    #A contentless FTS5 table forgets a row by being told its old tokens.
+                    self.db.execute("INSERT INTO title_index (title_index, rowid, tokens) VALUES ('delete', ?, ?)", (listing, " ".join(tokenize(old_title))))
+                self.db.execute("INSERT INTO title_index (rowid, tokens) VALUES (?, ?)", (listing, " ".join(tokenize(title))))
+
+    def indexing(self, rows, fields=DEFAULT_FIELDS, batch_size=1000):
+        """Passes `rows` through unchanged while adding them to the index.
+
+        Rows hold the values of `fields`, which must include title and link.
+        Every `batch_size` rows are written in one transaction.
+        """
+        if "title" not in fields or "link" not in fields:
+            raise ValueError("The title index needs the title and link fields")
+        title_at, link_at = fields.index("title"), fields.index("link")
+        price_at = fields.index("price") if "price" in fields else None
+        batch = []
+        try:
+            for row in rows:
+                price = price_value(row[price_at]) if price_at is not None else None
+                batch.append((canonical_link(row[link_at]), row[title_at], price))
+                if len(batch) >= batch_size:
+                    self.add_batch(batch)
+                    batch = []
+                yield row
+        finally:
+            if batch:
+                self.add_batch(batch)
+
+    def add(self, rows, fields=DEFAULT_FIELDS, batch_size=1000):
+        """Adds rows to the index and returns how many there were."""
+        return sum(1 for _ in self.indexing(rows, fields, batch_size))
+
+    def search(self, query, min_price=None, max_price=None, limit=20):
+        """Returns [(link, title, price)] of listings with every token of `query`, best match first.
+
+        Listings without a price are left out when a price range is given.
+        """
+        expression = match_expression(query)
+        if not expression:
+            return []
+        where = ["title_index MATCH ?"]
+        params = [expression]
+        if min_price is not None:
+            where.append("listings.price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            where.append("listings.price <= ?")
+            params.append(max_price)
+        params.append(limit)
+        return self.db.execute(
+            "SELECT listings.link, listings.title, listings.price FROM title_index "
+            "JOIN listings ON listings.id = title_index.rowid "
+            f"WHERE {' AND '.join(where)} "
+            "ORDER BY bm25(title_index), listings.price LIMIT ?",
+            params,
+        ).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Searches the titles indexed by collect.py --search.")
+    parser.add_argument("query")
+    parser.add_argument("--db", default="data/search.sqlite")
+    parser.add_argument("--min-price", type=int, help="lowest price in rupees")
+    parser.add_argument("--max-price", type=int, help="highest price in rupees")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with TitleIndex(args.db) as index:
+        for link, title, price in index.search(args.query, args.min_price, args.max_price, args.limit):
+            print(f"{price if price is not None else '-':>8}  {title}  {link}")
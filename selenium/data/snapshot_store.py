@@ -0,0 +1,189 @@
+#Stores saved product cards in a few large shard files instead of one file per card.
+#
+#Every record is appended to the current shard as
+#    key length (4 bytes) | data length (4 bytes) | key | zlib compressed html
+#and a line "key<TAB>shard<TAB>offset<TAB>length<TAB>crawled_at" is appended to
+#index.tsv so any record can be read back by key with a single seek, and its
+#crawl time (unix seconds) is known without reading it. When a shard grows past
+#`max_shard_bytes` a new one is started. Index lines written before crawl times
+#were recorded have no last column.
+import os
+import struct
+import threading
+import time
+import zlib
+
+HEADER = struct.Struct(">II")
+INDEX_FILE = "index.tsv"
+
+
+class SnapshotStore:
+    """Append-only, sharded store of compressed HTML snapshots."""
+
+    def __init__(self, path="data/snapshots", max_shard_bytes=64 * 1024 * 1024, level=6):
+        self.path = path
+        self.max_shard_bytes = max_shard_bytes
+        self.level = level
+        self.lock = threading.Lock()
+        self.index = {}
+        self.times = {}
+        self.shard = None
+        self.shard_number = 0
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            self.load_index()
+        elif self.shard_names():
+            self.rebuild_index()
+        self.index_file = open(index_path, "a", encoding="utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def shard_names(self):
+        """Returns the shard file names in the order they were written."""
+        return sorted(name for name in os.listdir(self.path) if name.startswith("shard-") and name.endswith(".bin"))
+
+    def shard_path(self, number):
+        return os.path.join(self.path, f"shard-{number:05d}.bin")
+
+    def load_index(self):
+        """Reads index.tsv; later lines for the same key replace earlier ones."""
+        with open(os.path.join(self.path, INDEX_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) not in (4, 5):
+                    continue
+                key, shard, offset, length = parts[:4]
+                self.index[key] = (int(shard), int(offset), int(length))
+                if len(parts) == 5:
+                    self.times[key] = int(parts[4])
+                else:
+                    self.times.pop(key, None)
+        if self.index:
+            self.shard_number = max(shard for shard, _, _ in self.index.values())
+
+    def rebuild_index(self):
+        """Recreates index.tsv by scanning every shard, e.g. after it was lost. Crawl times are lost with it."""
+        self.index = {}
+        self.times = {}
+        for name in self.shard_names():
+            number = int(name[6:11])
+            for key, offset, length, _ in self.scan_shard(number, read_data=False):
+                self.index[key] = (number, offset, length)
+            self.shard_number = number
+        with open(os.path.join(self.path, INDEX_FILE), "w", encoding="utf-8") as f:
+            for key, (shard, offset, length) in self.index.items():
+                f.write(f"{key}\t{shard}\t{offset}\t{length}\n")
+
+    def open_shard(self):
+        """Opens the shard to append to, rolling over to a new one when it is full."""
+        if self.shard is None:
+            self.shard = open(self.shard_path(self.shard_number), "ab")
+            #Drops a partly written record left behind by a crash.
+            end = max((offset + length for shard, offset, length in self.index.values() if shard == self.shard_number), default=0)
+            if self.shard.tell() > end:
+                self.shard.truncate(end)
+                self.shard.seek(end)
+        if self.shard.tell() >= self.max_shard_bytes:
+            self.shard.close()
+            self.shard_number += 1
+            self.shard = open(self.shard_path(self.shard_number), "ab")
+        return self.shard
+
+    def put(self, key, html, crawled_at=None):
+        """Appends one snapshot under `key`, crawled at `crawled_at` (unix seconds, now by default), and returns the number of bytes written."""
+        if "\t" in key or "\n" in key:
+            raise ValueError(f"Invalid snapshot key: {key!r}")
+        key_bytes = key.encode("utf-8")
+        data = zlib.compress(html.encode("utf-8"), self.level)
+        crawled_at = int(time.time() if crawled_at is None else crawled_at)
+        with self.lock:
+            shard = self.open_shard()
+            offset = shard.tell()
+            shard.write(HEADER.pack(len(key_bytes), len(data)) + key_bytes + data)
+            length = shard.tell() - offset
+            self.index[key] = (self.shard_number, offset, length)
+            self.times[key] = crawled_at
+            self.index_file.write(f"{key}\t{self.shard_number}\t{offset}\t{length}\t{crawled_at}\n")
+        return length
+
+    def flush(self):
+        """Writes buffered records and index lines to disk."""
+        with self.lock:
+            if self.shard is not None:
+                self.shard.flush()
+            self.index_file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.shard is not None:
+                self.shard.close()
+                self.shard = None
+            self.index_file.close()
+
+    def get(self, key):
+        """Returns the snapshot stored under `key`, or None."""
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        shard, offset, length = entry
+        if self.shard is not None and shard == self.shard_number:
+            self.flush()
+        with open(self.shard_path(shard), "rb") as f:
+            f.seek(offset)
+            record = f.read(length)
+        key_length, data_length = HEADER.unpack_from(record)
+        data = record[HEADER.size + key_length:HEADER.size + key_length + data_length]
+        return zlib.decompress(data).decode("utf-8")
+
+    def crawled_at(self, key):
+        """Returns when the snapshot under `key` was crawled, in unix seconds, or None if that was not recorded."""
+        return self.times.get(key)
+
+    def keys(self):
+        return list(self.index)
+
+    def locations(self):
+        """Returns (key, (shard, offset, length)) for every current record in write order."""
+        return sorted(self.index.items(), key=lambda item: item[1])
+
+    def scan_shard(self, number, read_data=True):
+        """Yields (key, offset, length, data) for every complete record in a shard."""
+        with open(self.shard_path(number), "rb") as f:
+            while True:
+                offset = f.tell()
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                key_length, data_length = HEADER.unpack(header)
+                key = f.read(key_length)
+                if read_data:
+                    data = f.read(data_length)
+                    if len(data) < data_length:
+                        return
+                else:
+                    data = None
+                    f.seek(data_length, os.SEEK_CUR)
+                    if f.tell() > os.fstat(f.fileno()).st_size:
+                        return
+                yield key.decode("utf-8"), offset, HEADER.size + key_length + data_length, data
+
+    def iter_records(self):
+        """Streams (key, html) for every current snapshot, shard by shard in write order."""
+        self.flush()
+        for name in self.shard_names():
+            number = int(name[6:11])
+            for key, offset, length, data in self.scan_shard(number):
+                #Skips records that were replaced by a later put of the same key.
+                if self.index.get(key) == (number, offset, length):
+                    yield key, zlib.decompress(data).decode("utf-8")
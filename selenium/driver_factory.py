@@ -0,0 +1,66 @@
+#Starts Chrome drivers for the crawler scripts.
+#
+#The "lean" profile runs headless, skips the GPU and extensions, does not wait
+#for sub-resources before handing the page back, and blocks images, media,
+#fonts and tracking scripts. The cards are read from the DOM, so none of those
+#downloads are needed for extraction.
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+#URL patterns blocked in the lean profile, in Network.setBlockedURLs syntax.
+BLOCKED_URLS = [
+    #images
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.svg", "*.ico", "*rukminim*.flixcart.com*",
+    #media
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    #fonts
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    #third-party analytics and ads
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*",
+    "*hotjar.com*", "*clarity.ms*", "*criteo.com*", "*adservice.google.*",
+]
+
+LEAN_ARGUMENTS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--mute-audio",
+    "--no-first-run",
+    "--blink-settings=imagesEnabled=false",
+    "--window-size=1366,900",
+]
+
+
+def lean_options():
+    """Returns the Chrome options of the lean profile."""
+    opt = Options()
+    for argument in LEAN_ARGUMENTS:
+        opt.add_argument(argument)
+    opt.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.media_stream": 2,
+        "profile.managed_default_content_settings.notifications": 2,
+    })
+    #Hands the page back once the DOM is parsed; readiness.py waits for the grid itself.
+    opt.page_load_strategy = "eager"
+    return opt
+
+
+def block_urls(driver, patterns=BLOCKED_URLS):
+    """Makes the browser refuse requests matching `patterns`."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+
+
+def make_driver(profile="lean"):
+    """Starts a Chrome driver with the "lean" or the "default" (visible, unmodified) profile."""
+    if profile == "default":
+        return webdriver.Chrome()
+    if profile != "lean":
+        raise ValueError(f"Unknown driver profile: {profile}")
+    driver = webdriver.Chrome(options=lean_options())
+    block_urls(driver)
+    return driver
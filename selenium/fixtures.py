@@ -0,0 +1,166 @@
+#Recorded or generated Flipkart search pages served from a local HTTP server,
+#so the crawler and the parser can be run and measured without the live site.
+#
+#    python fixtures.py generate bench_fixtures --pages 20
+#    python fixtures.py serve bench_fixtures --port 8000
+#
+#A fixture folder holds search_<page>.html files. Requests for
+#/search?q=<query>&page=<n> are answered with page n, wrapping around when
+#there are fewer files than pages.
+import argparse
+import os
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+BRANDS = ["Samsung Galaxy", "realme", "POCO", "vivo", "OPPO", "Motorola", "REDMI", "Apple iPhone", "Infinix", "iQOO"]
+COLOURS = ["Midnight Black", "Ocean Blue", "Mint Green", "Silver", "Purple", "Titanium Grey"]
+STORAGE = [(4, 64), (4, 128), (6, 128), (8, 128), (8, 256), (12, 256)]
+PAGE_FILE = re.compile(r"search_(\d+)\.html$")
+
+
+def fixture_card(rng, page, position):
+    """Returns the outerHTML of one product card shaped like Flipkart's."""
+    brand = rng.choice(BRANDS)
+    model = f"{rng.choice('ACFMNXZ')}{rng.randint(5, 95)}{rng.choice(['', ' 5G', ' Pro', ' Neo'])}"
+    ram, rom = rng.choice(STORAGE)
+    title = f"{brand} {model} ({rng.choice(COLOURS)}, {rom} GB)"
+    pid = "MOB" + "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789") for _ in range(13))
+    item = "itm" + "".join(rng.choice("0123456789abcdef") for _ in range(13))
+    slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+    price = rng.randint(60, 1600) * 100 - 1
+    mrp = int(price * rng.uniform(1.05, 1.6))
+    rating = round(rng.uniform(3.6, 4.7), 1)
+    href = (
+        f"/{slug}/p/{item}?pid={pid}&amp;lid=LST{pid}&amp;marketplace=FLIPKART&amp;q=mobile&amp;store=tyy%2F4io"
+        f"&amp;srno=s_{page}_{position}&amp;otracker=search&amp;otracker1=search&amp;fm=organic"
+        f"&amp;iid={rng.getrandbits(64):016x}.{pid}.SEARCH&amp;ppt=None&amp;ppn=None&amp;ssid={rng.getrandbits(40):010x}"
+    )
+    return (
+        f'<div class="_75nlfW" data-id="{pid}"><div style="width:100%"><div class="tUxRFH" data-tkid="{rng.getrandbits(64):016x}">'
+        f'<a class="CGtC98" href="{href}" rel="noopener noreferrer">'
+        f'<div class="Otbq5D"><div class="yPq5Io"><div><div class="_4WELSP" style="height:200px;width:200px">'
+        f'<img loading="eager" class="DByuf4" alt="{title}" src="https://rukminim2.flixcart.com/image/312/312/mobile/{item}.jpeg?q=70"></div></div></div></div>'
+        f'<div class="yKfJKb row"><div class="col col-7-12"><div class="KzDlHZ">{title}</div>'
+        f'<div class="_5OesEi"><span class="Y1HWO0"><div class="XQDdHH">{rating}</div></span>'
+        f'<span class="Wphh3N"><span>{rng.randint(100, 99999):,} Ratings&nbsp;&amp;&nbsp;{rng.randint(10, 9999):,} Reviews</span></span></div>'
+        f'<div class="_6NESgJ"><ul class="G4BRas"><li class="J+igdf">{ram} GB RAM | {rom} GB ROM</li>'
+        f'<li class="J+igdf">{rng.choice([16.51, 16.76, 17.02])} cm Display</li><li class="J+igdf">{rng.choice([50, 64, 108])}MP Rear Camera</li>'
+        f'<li class="J+igdf">{rng.choice([5000, 6000])} mAh Battery</li></ul></div></div>'
+        f'<div class="col col-5-12 BfVC2z"><div class="cN1yYO"><div class="hl05eU">'
+        f'<div class="Nx9bqj _4b5DiR">&#8377;{price:,}</div><div class="yRaY8j ZYYwLA">&#8377;{mrp:,}</div>'
+        f'<div class="UkUFwK"><span>{round((mrp - price) * 100 / mrp)}% off</span></div></div></div></div></div>'
+        f'</a></div></div></div>'
+    )
+
+
+def fixture_page_cards(page, cards=24, seed=0):
+    """Returns the product cards of one generated page, the same ones fixture_page() lays out."""
+    rng = random.Random(seed * 100003 + page)
+    return [fixture_card(rng, page, position) for position in range(1, cards + 1)]
+
+
+def fixture_documents(pages=6, cards=24, seed=0):
+    """Returns (name, card html) for every card of the first `pages` generated pages, like collect.iter_documents()."""
+    return [
+        (f"search_{page}.html#{position}", card)
+        for page in range(1, pages + 1)
+        for position, card in enumerate(fixture_page_cards(page, cards, seed), 1)
+    ]
+
+
+def fixture_page(page, cards=24, seed=0):
+    """Returns a whole search results page with `cards` product cards."""
+    grid = "".join(f'<div class="cPHDOP col-12-12">{card}</div>' for card in fixture_page_cards(page, cards, seed))
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Mobile - Buy Products Online at Best Price in India</title>'
+        '<link rel="stylesheet" href="https://static-assets-web.flixcart.com/app.css"></head>'
+        f'<body><div id="container"><div class="DOjaWF gdgoEp">{grid}</div>'
+        f'<nav class="WSL9JP"><a class="cn++Ap" href="/search?q=mobile&amp;page={page + 1}">Next</a></nav></div>'
+        '<script src="https://www.googletagmanager.com/gtm.js"></script></body></html>'
+    )
+
+
+def write_fixture_pages(folder, pages=20, cards=24, seed=0):
+    """Writes generated search_<page>.html files into `folder`."""
+    os.makedirs(folder, exist_ok=True)
+    for page in range(1, pages + 1):
+        with open(os.path.join(folder, f"search_{page}.html"), "w", encoding="utf-8") as f:
+            f.write(fixture_page(page, cards, seed))
+
+
+def load_fixture_pages(folder):
+    """Reads every search_<page>.html in `folder`, ordered by page number."""
+    pages = []
+    for name in os.listdir(folder):
+        match = PAGE_FILE.match(name)
+        if match:
+            with open(os.path.join(folder, name), "rb") as f:
+                pages.append((int(match.group(1)), f.read()))
+    return [body for _, body in sorted(pages)]
+
+
+class FixtureServer:
+    """Serves fixture pages on localhost in a background thread.
+
+    `url` is a search URL template that can be handed to the crawler as base_url.
+    """
+
+    def __init__(self, folder, port=0):
+        pages = load_fixture_pages(folder)
+        if not pages:
+            raise FileNotFoundError(f"No search_<page>.html fixtures in {folder}")
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                params = parse_qs(urlsplit(self.path).query)
+                try:
+                    page = int(params.get("page", ["1"])[0].strip())
+                except ValueError:
+                    page = 1
+                body = pages[(page - 1) % len(pages)]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}/search?q={{query}}&page={{page}}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates or serves fixture search pages.")
+    parser.add_argument("command", choices=["generate", "serve"])
+    parser.add_argument("folder")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        write_fixture_pages(args.folder, args.pages, args.cards, args.seed)
+        print(f"Wrote {args.pages} pages to {args.folder}")
+    else:
+        with FixtureServer(args.folder, args.port) as server:
+            print(f"Serving {args.folder} at {server.url}")
+            server.thread.join()
@@ -0,0 +1,153 @@
+#Downloads search pages without a browser over pooled keep-alive connections.
+import gzip
+import http.client
+import queue
+import threading
+import zlib
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-IN,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+
+class HttpPool:
+    """Keeps up to `size` open connections per host and reuses them between requests."""
+
+    def __init__(self, size=4, timeout=20, headers=HEADERS):
+        self.size = size
+        self.timeout = timeout
+        self.headers = dict(headers)
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    def pool_for(self, scheme, host):
+        with self.lock:
+            pool = self.pools.get((scheme, host))
+            if pool is None:
+                pool = self.pools[(scheme, host)] = queue.LifoQueue()
+            return pool
+
+    def connect(self, scheme, host):
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=self.timeout)
+        return http.client.HTTPConnection(host, timeout=self.timeout)
+
+    def request(self, url, headers=None):
+        """Sends one GET and returns (status, response headers, body bytes)."""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        pool = self.pool_for(parts.scheme, parts.netloc)
+        all_headers = dict(self.headers, **(headers or {}))
+        #A pooled connection may have been closed by the server, so retry once on a fresh one.
+        for attempt in range(2):
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                conn = self.connect(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers=all_headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if response.will_close or pool.qsize() >= self.size:
+                conn.close()
+            else:
+                pool.put(conn)
+            return response.status, response.headers, body
+
+    def get(self, url, headers=None, max_redirects=5):
+        """Returns (final url, status, headers, decoded text), following redirects."""
+        for _ in range(max_redirects + 1):
+            status, response_headers, body = self.request(url, headers)
+            if status in (301, 302, 303, 307, 308) and response_headers.get("Location"):
+                url = urljoin(url, response_headers["Location"])
+                continue
+            return url, status, response_headers, decode_body(response_headers, body)
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def close(self):
+        """Closes every pooled connection."""
+        with self.lock:
+            pools, self.pools = self.pools, {}
+        for pool in pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
+
+
+def decode_body(headers, body):
+    """Decompresses and decodes a response body."""
+    encoding = (headers.get("Content-Encoding") or "").lower()
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "deflate":
+        body = zlib.decompress(body)
+    charset = headers.get_content_charset() or "utf-8"
+    return body.decode(charset, errors="replace")
+
+
+class CardSplitter(HTMLParser):
+    """Finds the source text of every element carrying a class, like `outerHTML` would."""
+
+    def __init__(self, class_name):
+        super().__init__(convert_charrefs=False)
+        self.class_name = class_name
+        self.source = ""
+        self.line_starts = [0]
+        self.tag = None
+        self.depth = 0
+        self.start = None
+        self.spans = []
+
+    def position(self):
+        """Returns the position in the source of the tag being handled."""
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def split(self, html):
+        """Returns the HTML of every matching element in document order."""
+        self.source = html
+        position = html.find("\n")
+        while position != -1:
+            self.line_starts.append(position + 1)
+            position = html.find("\n", position + 1)
+        self.feed(html)
+        self.close()
+        return [html[start:end] for start, end in self.spans]
+
+    def handle_starttag(self, tag, attrs):
+        if self.start is not None:
+            #Only tags with the card's own name can close it, so only those are counted.
+            if tag == self.tag:
+                self.depth += 1
+            return
+        classes = (dict(attrs).get("class") or "").split()
+        if self.class_name in classes:
+            self.tag = tag
+            self.depth = 1
+            self.start = self.position()
+
+    def handle_endtag(self, tag):
+        if self.start is None or tag != self.tag:
+            return
+        self.depth -= 1
+        if self.depth == 0:
+            end = self.source.index(">", self.position()) + 1
+            self.spans.append((self.start, end))
+            self.start = None
+
+
+def cards_from_html(html, class_name):
+    """Returns the outerHTML of every element with `class_name` in a downloaded page."""
+    return CardSplitter(class_name).split(html)
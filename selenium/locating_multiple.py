@@ -1,22 +1,26 @@
 #import statements
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-import time
+from bulk import bulk_text
+from driver_factory import make_driver
+from readiness import Readiness
 
 #Opens Flipkart's search results for the given link
-driver = webdriver.Chrome()
+#Starts a headless Chrome that skips images, fonts and trackers.
+driver = make_driver("lean")
+readiness = Readiness("KzDlHZ")
 # print the 
 for i in range(1,20):
+    readiness.pause()
     driver.get(f"https://www.flipkart.com/search?q=mobile&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page = {i}")
+    #Waits for the titles to render instead of sleeping a fixed second.
+    readiness.wait(driver)
 
-    elems = driver.find_elements(By.CLASS_NAME, "KzDlHZ")
-    print(f"{len(elems)} items found")
-    print(elems)
-    for elem in elems:
-        print(elem.text)
+    #Reads the text of every title in one browser call instead of one call per element.
+    titles = bulk_text(driver, "KzDlHZ")
+    print(f"{len(titles)} items found")
+    for title in titles:
+        print(title)
     #print(elem.get_attribute("outerHTML"))
     #print(elem.text)
 
-    time.sleep(1)
+print(readiness.summary())
 driver.close()
\ No newline at end of file
@@ -1,13 +1,14 @@
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-import time
 
-driver = webdriver.Chrome()
+from driver_factory import make_driver
+from readiness import wait_for_selector
+
+#Starts a headless Chrome that skips images, fonts and trackers.
+driver = make_driver("lean")
 driver.get("https://www.flipkart.com/search?q=mobile&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off")
+wait_for_selector(driver, "KzDlHZ")
 
 elem = driver.find_element(By.CLASS_NAME, "KzDlHZ")
 print(elem.get_attribute("outerHTML"))
 
-time.sleep(10)
 driver.close()
\ No newline at end of file
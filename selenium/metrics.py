@@ -0,0 +1,108 @@
+#Times every page of a crawl by stage and writes the numbers to a JSON-lines file.
+#
+#Stages are "navigate" (loading or downloading the page), "wait" (waiting for
+#the product grid), "extract" (reading the cards out of the page) and "write"
+#(saving them). Each page also counts its items, retries and bytes written.
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ("navigate", "wait", "extract", "write")
+
+
+@contextmanager
+def timed(record, stage):
+    """Adds the time spent in the block to `record`'s stage; does nothing if `record` is None."""
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = record["stages"]
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+def count(record, counter, amount=1):
+    """Adds `amount` to one of `record`'s counters; does nothing if `record` is None."""
+    if record is not None:
+        record[counter] += amount
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class CrawlMetrics:
+    """Collects one record per crawled page and exports them as JSON lines."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = {}
+        self.finished = []
+        self.file = open(path, "a", encoding="utf-8") if path else None
+
+    def start(self, query, page, url=None):
+        """Starts the record of one page and returns it."""
+        record = {"type": "page", "query": query, "page": page, "url": url, "started": time.time(),
+                  "stages": {}, "items": 0, "retries": 0, "bytes": 0}
+        with self.lock:
+            self.records[(query, page)] = record
+        return record
+
+    def record(self, query, page):
+        """Returns the record of a page started earlier, or None."""
+        with self.lock:
+            return self.records.get((query, page))
+
+    def finish(self, query, page):
+        """Closes the record of a page and appends it to the metrics file."""
+        with self.lock:
+            record = self.records.pop((query, page), None)
+            if record is None:
+                return
+            record["total"] = sum(record["stages"].values())
+            self.finished.append(record)
+            if self.file:
+                self.file.write(json.dumps(record) + "\n")
+                self.file.flush()
+
+    def summary(self):
+        """Returns p50/p95/p99 of every stage and the totals of every counter."""
+        with self.lock:
+            records = list(self.finished)
+        summary = {"type": "summary", "pages": len(records), "stages": {}}
+        for stage in STAGES + ("total",):
+            if stage == "total":
+                values = sorted(record["total"] for record in records)
+            else:
+                values = sorted(record["stages"][stage] for record in records if stage in record["stages"])
+            if values:
+                summary["stages"][stage] = {
+                    "p50": percentile(values, 0.50),
+                    "p95": percentile(values, 0.95),
+                    "p99": percentile(values, 0.99),
+                    "sum": sum(values),
+                }
+        for counter in ("items", "retries", "bytes"):
+            summary[counter] = sum(record[counter] for record in records)
+        return summary
+
+    def report(self):
+        """Prints the summary, appends it to the metrics file and closes the file."""
+        summary = self.summary()
+        print(f"{summary['pages']} pages, {summary['items']} items, {summary['retries']} retries, {summary['bytes']} bytes written")
+        for stage, values in summary["stages"].items():
+            print(f"  {stage:<8} p50 {values['p50'] * 1000:8.1f}ms  p95 {values['p95'] * 1000:8.1f}ms  p99 {values['p99'] * 1000:8.1f}ms")
+        if self.file:
+            self.file.write(json.dumps(summary) + "\n")
+            self.file.close()
+            self.file = None
+        return summary
@@ -0,0 +1,46 @@
+#Command line flags shared by project.py, pipeline.py and scheduler.py, so the
+#three crawlers take the same options with the same defaults and help.
+from browser_pool import lease_driver
+from crawler import SEARCH_URL
+from driver_factory import make_driver
+from page_cache import PageCache
+
+
+def add_crawl_arguments(parser):
+    """Adds the flags choosing how pages are loaded: workers, rate, mode and browsers."""
+    parser.add_argument("--workers", type=int, default=4, help="number of headless drivers fetching pages at once")
+    parser.add_argument("--rate", type=float, default=2.0, help="maximum page loads per second per host")
+    parser.add_argument("--base-url", default=SEARCH_URL, help="search URL template with {query} and {page}, e.g. a local fixture server")
+    parser.add_argument("--mode", choices=["browser", "http", "cdp"], default="browser", help="load pages in Chrome, or download them and only use Chrome when no cards are found, or use --workers tabs of one Chrome over CDP")
+    parser.add_argument("--debugger-address", help="host:port of a running Chrome to use in cdp mode instead of starting one")
+    parser.add_argument("--profile", choices=["lean", "default"], default="lean", help="lean: headless and blocks images, fonts and trackers")
+    parser.add_argument("--browser-pool", help="URL of a browser_pool.py service to lease warm browsers from instead of starting them")
+
+
+def add_cache_arguments(parser):
+    """Adds the on-disk page cache flags."""
+    parser.add_argument("--cache", help="folder of an on-disk page cache; pages cached there are not fetched again")
+    parser.add_argument("--cache-ttl", type=float, default=6, help="hours a cached page stays fresh")
+    parser.add_argument("--cache-size", type=float, default=256, help="largest size of the page cache in MB")
+
+
+def add_record_arguments(parser, metrics="data/crawl_metrics.jsonl"):
+    """Adds the flags naming the crawl state, stage timings and price history files."""
+    parser.add_argument("--state", default="data/crawl_state.json", help="file recording finished pages and seen products")
+    parser.add_argument("--metrics", default=metrics, help="JSON-lines file the per-page stage timings are appended to")
+    parser.add_argument("--history", help="also record the price of every card crawled, known products included, in this SQLite price history, see data/history.py")
+
+
+def driver_maker(args, browser_pool=None):
+    """Returns the function starting a driver: leased from --browser-pool if given, else a local Chrome."""
+    browser_pool = browser_pool or args.browser_pool
+    if browser_pool:
+        return lambda: lease_driver(browser_pool, args.profile)
+    return lambda: make_driver(args.profile)
+
+
+def page_cache(args):
+    """Returns the PageCache --cache names, or None."""
+    if not args.cache:
+        return None
+    return PageCache(args.cache, ttl=args.cache_ttl * 3600, max_bytes=args.cache_size * 1024 * 1024)
@@ -0,0 +1,150 @@
+#On-disk cache of fetched search pages so re-crawls skip the network and the browser.
+#
+#Each entry is a JSON file named after the hash of the canonical URL holding the
+#page's cards, a hash of their content, the time they were fetched and the ETag
+#and Last-Modified headers of the response. A file's modification time is its
+#last use, which is what the LRU eviction goes by.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from data.dedupe import canonical_url
+
+
+def content_hash(cards):
+    """Returns a hash of a page's cards, used to tell whether a refetch changed anything."""
+    digest = hashlib.sha256()
+    for card in cards:
+        digest.update(card.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class PageCache:
+    """Size-bounded LRU cache of page cards with a TTL and ETag/content-hash revalidation."""
+
+    def __init__(self, path="data/page_cache", ttl=6 * 3600, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "unchanged": 0, "evicted": 0}
+        os.makedirs(path, exist_ok=True)
+        #File name -> size, least recently used first.
+        self.entries = OrderedDict()
+        files = []
+        for name in os.listdir(path):
+            if name.endswith(".json"):
+                info = os.stat(os.path.join(path, name))
+                files.append((info.st_mtime, name, info.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+        self.total = sum(self.entries.values())
+
+    def file_name(self, url):
+        return hashlib.sha1(canonical_url(url).encode("utf-8")).hexdigest() + ".json"
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def get(self, url):
+        """Returns the cached entry for `url`, fresh or stale, or None."""
+        name = self.file_name(url)
+        try:
+            with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched"] < self.ttl
+
+    def lookup(self, url):
+        """Returns (cards, entry): cards when a fresh entry exists, and the entry itself for revalidation."""
+        entry = self.get(url)
+        if self.is_fresh(entry):
+            self.count("hits")
+            self.touch(url)
+            return entry["cards"], entry
+        self.count("misses")
+        return None, entry
+
+    def validators(self, entry):
+        """Returns the conditional request headers for revalidating a stale entry."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url):
+        """Marks an entry as just used."""
+        name = self.file_name(url)
+        try:
+            os.utime(os.path.join(self.path, name))
+        except OSError:
+            return
+        with self.lock:
+            if name in self.entries:
+                self.entries.move_to_end(name)
+
+    def revalidated(self, url, entry):
+        """Restarts the TTL of an entry the server said has not changed (HTTP 304)."""
+        self.count("revalidated")
+        self.write(url, entry["cards"], entry.get("etag"), entry.get("last_modified"))
+        return entry["cards"]
+
+    def put(self, url, cards, etag=None, last_modified=None):
+        """Stores the cards fetched for `url`."""
+        entry = self.get(url)
+        if entry and entry.get("hash") == content_hash(cards):
+            self.count("unchanged")
+        self.write(url, cards, etag, last_modified)
+
+    def write(self, url, cards, etag=None, last_modified=None):
+        name = self.file_name(url)
+        entry = {
+            "url": canonical_url(url),
+            "fetched": time.time(),
+            "hash": content_hash(cards),
+            "etag": etag,
+            "last_modified": last_modified,
+            "cards": cards,
+        }
+        data = json.dumps(entry).encode("utf-8")
+        file_path = os.path.join(self.path, name)
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        with self.lock:
+            self.total += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in `max_bytes`."""
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total -= size
+            self.stats["evicted"] += 1
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def summary(self):
+        """Returns a one line report of the cache hits and misses."""
+        with self.lock:
+            stats = dict(self.stats)
+            entries, total = len(self.entries), self.total
+        return (
+            f"cache: {stats['hits']} hits, {stats['misses']} misses, {stats['revalidated']} revalidated, "
+            f"{stats['unchanged']} unchanged on refetch, {stats['evicted']} evicted, "
+            f"{entries} entries ({total / 1024 / 1024:.1f} MB)"
+        )
@@ -0,0 +1,168 @@
+#Crawls and parses in one run: the cards the crawler captures go through a
+#bounded in-memory queue straight to the parser, and rows are written while the
+#crawl is still running instead of after it, e.g.
+#
+#    python pipeline.py --query mobile --last-page 5 --output mobile.csv
+#
+#The queue holds at most --queue pages. When the parser falls behind, the
+#crawler waits instead of piling pages up in memory. Nothing is written to disk
+#but the rows unless --store is given; then the cards are also appended to a
+#snapshot store, like project.py does.
+import argparse
+import queue
+import threading
+import time
+
+from crawl_state import CrawlState
+from crawler import CARD_CLASS, crawl
+from data.backends import BACKENDS, FAST_SUFFIX
+from data.collect import parse_documents, parse_parallel, write_rows
+from data.columnar import FORMATS, write_columnar
+from data.dedupe import unique_rows
+from data.fieldspec import DEFAULT_FIELDS, FIELDS
+from data.history import PriceHistory
+from data.snapshot_store import SnapshotStore
+from metrics import CrawlMetrics
+from options import add_crawl_arguments, add_record_arguments, driver_maker
+from readiness import Readiness
+
+END = object()
+
+
+def produce(pages, crawled, stop, failed):
+    """Puts every crawled (page, cards) on the queue, then END; runs in its own thread."""
+    try:
+        for item in crawled:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                break
+    except BaseException as e:
+        failed.append(e)
+    finally:
+        #Quits the drivers, also when the consumer stopped early.
+        crawled.close()
+        pages.put(END)
+
+
+def crawled_documents(crawled, query, queue_size=8, store=None, state=None, metrics=None):
+    """Runs the crawl in a thread and yields (name, card html) for every card as its page arrives.
+
+    `crawled` yields (page, cards) like crawler.crawl(). At most `queue_size`
+    pages wait between the crawler and the parser. With a `store` every page
+    is also saved through `state` before its cards are handed on.
+    """
+    pages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    failed = []
+    thread = threading.Thread(target=produce, args=(pages, crawled, stop, failed), daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is END:
+                break
+            page, cards = item
+            print(f"page {page}: {len(cards)} items found")
+            if store is not None:
+                saved = state.save_page(store, query, page, cards, metrics.record(query, page) if metrics else None)
+                print(f"page {page}: {saved} new items saved")
+            if metrics:
+                metrics.finish(query, page)
+            for number, card in enumerate(cards):
+                yield f"{query}/{page}/{number}", card
+    finally:
+        stop.set()
+        #Unblocks a producer waiting for room so it can see `stop`.
+        while thread.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+    if failed:
+        raise failed[0]
+
+
+def pipeline_rows(documents, workers=1, chunk_size=20, backend="bs4", fields=DEFAULT_FIELDS, timing=None):
+    """Parses documents as they arrive and yields their rows in crawl order.
+
+    With `timing` (a dict) the seconds until the first row are stored in
+    timing["first_row"].
+    """
+    start = time.perf_counter()
+    if workers > 1:
+        parsed = parse_parallel(documents, workers, chunk_size, backend, fields)
+    else:
+        parsed = parse_documents(documents, False, backend, fields)
+    for rows in parsed:
+        for row in rows:
+            if timing is not None and "first_row" not in timing:
+                timing["first_row"] = time.perf_counter() - start
+            yield row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawls Flipkart search results and parses the cards into rows in one streaming run.")
+    parser.add_argument("--query", default="mobile")
+    parser.add_argument("--first-page", type=int, default=1)
+    parser.add_argument("--last-page", type=int, default=19)
+    add_crawl_arguments(parser)
+    parser.add_argument("--queue", type=int, default=8, help="pages that may wait between the crawler and the parser")
+    parser.add_argument("--parse-workers", type=int, default=1, help="processes parsing in parallel; 1 parses in this process")
+    parser.add_argument("--chunk-size", type=int, default=20, help="cards handed to a parse worker at a time")
+    parser.add_argument("--batch-size", type=int, default=20, help="rows written to the output at a time")
+    parser.add_argument("--parser", choices=list(BACKENDS), default="bs4", help="HTML parser backend, see data/backends.py")
+    parser.add_argument("--fast-path", action="store_true", help="read title/price/link with regular expressions, see data/fastpath.py")
+    parser.add_argument("--fields", nargs="+", choices=list(FIELDS), default=list(DEFAULT_FIELDS), help="columns to extract, see data/fieldspec.py")
+    parser.add_argument("--format", choices=("csv",) + FORMATS, default="csv", help="csv, or typed columns with integer prices")
+    parser.add_argument("--output", help="output file, <query>.csv/.parquet/.arrow by default")
+    parser.add_argument("--dedupe", action="store_true", help="keep only the first row of every product, by canonical link")
+    parser.add_argument("--store", help="also append the cards to this snapshot store, resuming from --state")
+    add_record_arguments(parser, metrics=None)
+    args = parser.parse_args()
+
+    query = args.query
+    pages = range(args.first_page, args.last_page + 1)
+    store = state = None
+    if args.store:
+        store = SnapshotStore(args.store)
+        state = CrawlState(args.state)
+        state.resume(store, query)
+        pages = state.pending(query, pages)
+    readiness = Readiness(CARD_CLASS)
+    metrics = CrawlMetrics(args.metrics)
+    crawled = crawl(query, pages, workers=args.workers, rate=args.rate, base_url=args.base_url, readiness=readiness, mode=args.mode, debugger_address=args.debugger_address, make_driver=driver_maker(args), metrics=metrics)
+    documents = crawled_documents(crawled, query, args.queue, store, state, metrics)
+    backend = args.parser + FAST_SUFFIX if args.fast_path else args.parser
+    timing = {}
+    start = time.perf_counter()
+    rows = pipeline_rows(documents, args.parse_workers, args.chunk_size, backend, args.fields, timing)
+    if args.dedupe:
+        rows = unique_rows(rows, args.fields)
+    history = PriceHistory(args.history) if args.history else None
+    if history is not None:
+        #Every crawled card is parsed here, so products seen in earlier crawls get this crawl's price too.
+        rows = history.recording(rows, state.started if state else None, args.fields, args.batch_size)
+    try:
+        if args.format == "csv":
+            output = args.output or f"{query}.csv"
+            count = write_rows(rows, output, args.batch_size, args.fields)
+        else:
+            output = args.output or f"{query}.{args.format}"
+            count = write_columnar(rows, output, args.format, args.batch_size, fields=args.fields)
+    finally:
+        if store is not None:
+            store.close()
+        if history is not None:
+            history.close()
+
+    print(f"Wrote {count} rows to {output} in {time.perf_counter() - start:.1f}s")
+    if "first_row" in timing:
+        print(f"First row after {timing['first_row']:.2f}s")
+    print(readiness.summary())
+    metrics.report()
@@ -1,30 +1,65 @@
 #import statements
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.common.by import By
-import time
+import argparse
+import os
 
-#Opens Flipkart's search results for the query "mobile."
-driver = webdriver.Chrome()
-query = "mobile"
-file = 0
+from crawl_state import CrawlState
+from crawler import CARD_CLASS, crawl
+from data.history import PriceHistory
+from data.snapshot_store import SnapshotStore
+from metrics import CrawlMetrics
+from options import add_cache_arguments, add_crawl_arguments, add_record_arguments, driver_maker, page_cache
+from readiness import Readiness
 
-#Loops through the first 19 pages of search results.
-for i in range(1,20):
-    driver.get(f"https://www.flipkart.com/search?q={query}&otracker=search&otracker1=search&marketplace=FLIPKART&as-show=on&as=off&page={i}")
+parser = argparse.ArgumentParser(description="Saves Flipkart search result cards as HTML files.")
+parser.add_argument("--query", default="mobile")
+parser.add_argument("--first-page", type=int, default=1)
+parser.add_argument("--last-page", type=int, default=19)
+add_crawl_arguments(parser)
+parser.add_argument("--wait", choices=["selector", "network"], default="selector", help="wait for the product grid or for network idle")
+parser.add_argument("--timeout", type=float, default=30, help="longest wait for a page to be ready, in seconds")
+parser.add_argument("--store", default="data/snapshots", help="folder of the snapshot store the cards are appended to")
+parser.add_argument("--restart", action="store_true", help="crawl every page again, still skipping products already saved")
+add_cache_arguments(parser)
+add_record_arguments(parser)
+args = parser.parse_args()
 
-    #Finds all elements matching the class name _75nlfW.
-    elems = driver.find_elements(By.CLASS_NAME, "_75nlfW")
+#Crawls Flipkart's search results for --query ("mobile" by default).
+query = args.query
+os.makedirs("data", exist_ok=True)
+store = SnapshotStore(args.store)
+#Picks up where an earlier run stopped: finished pages are skipped and numbering continues.
+state = CrawlState(args.state)
+if args.restart:
+    state.restart(query)
+state.resume(store, query)
+pages = state.pending(query, range(args.first_page, args.last_page + 1))
+print(f"{len(pages)} pages left to crawl")
+readiness = Readiness(CARD_CLASS, mode=args.wait, max_timeout=args.timeout)
+metrics = CrawlMetrics(args.metrics)
+cache = page_cache(args)
+history = PriceHistory(args.history) if args.history else None
+
+#Loops through the pages still to crawl between --first-page and --last-page, several pages at a time.
+#Pages come back in order, so the file numbering is the same as a one-driver crawl.
+for i, cards in crawl(query, pages, workers=args.workers, rate=args.rate, base_url=args.base_url, readiness=readiness, mode=args.mode, debugger_address=args.debugger_address, cache=cache, make_driver=driver_maker(args), metrics=metrics):
     #Prints the number of items found on the page.
-    print(f"{len(elems)} items found")
-    print(elems)
-    for elem in elems:
-        #Saves the HTML content of each element to separate .html files in a folder named data.
-        d = elem.get_attribute("outerHTML")
-        with open(f"data/{query}_{file}.html","w", encoding="utf-8") as f:
-            f.write(d)
-            file +=1
-    #print(elem.text)
+    print(f"page {i}: {len(cards)} items found")
+    #Appends the new cards to the snapshot store in the data folder, skipping products already saved.
+    saved = state.save_page(store, query, i, cards, metrics.record(query, i))
+    metrics.finish(query, i)
+    print(f"page {i}: {saved} new items saved")
+    #Products saved by an earlier crawl are not stored again, but their price today still counts.
+    if history is not None:
+        history.record_cards(cards, state.started)
+store.close()
+if history is not None:
+    history.close()
 
-    time.sleep(2)
-driver.close()
\ No newline at end of file
+#Reports how long the pages took to become ready.
+print(readiness.summary())
+if cache:
+    print(cache.summary())
+#Prints the p50/p95/p99 of every stage.
+metrics.report()
+for url, seconds, ready in readiness.waits:
+    print(f"{seconds:.2f}s {'ready' if ready else 'timed out'} {url}")
@@ -0,0 +1,109 @@
+#Waits for a search page to be ready instead of sleeping for a fixed time.
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+#Number of resource entries the page has loaded so far and whether the document is done.
+RESOURCES_JS = "return [performance.getEntriesByType('resource').length, document.readyState];"
+
+
+def wait_for_selector(driver, class_name, timeout=10, poll=0.1):
+    """Waits until an element with `class_name` exists. Returns True if it appeared."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(
+            EC.presence_of_element_located((By.CLASS_NAME, class_name))
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_network_idle(driver, idle=0.5, timeout=10, poll=0.1):
+    """Waits until the page is loaded and no new resources arrived for `idle` seconds."""
+    deadline = time.monotonic() + timeout
+    last_count = -1
+    quiet_since = time.monotonic()
+    while time.monotonic() < deadline:
+        count, state = driver.execute_script(RESOURCES_JS)
+        now = time.monotonic()
+        if count != last_count or state != "complete":
+            last_count = count
+            quiet_since = now
+        elif now - quiet_since >= idle:
+            return True
+        time.sleep(poll)
+    return False
+
+
+class Readiness:
+    """Waits for pages to be ready and backs off when the site slows down.
+
+    Each wait is given a timeout of a few times the recent average wait, kept
+    between `min_timeout` and `max_timeout`. A timed out wait doubles the pause
+    taken before the next page load and fast waits shrink it back to zero.
+    Every wait is recorded in `waits` as (url, seconds, ready).
+    """
+
+    def __init__(self, class_name="_75nlfW", mode="selector", min_timeout=5, max_timeout=30, max_backoff=10):
+        self.class_name = class_name
+        self.mode = mode
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.max_backoff = max_backoff
+        self.average = None
+        self.backoff = 0.0
+        self.waits = []
+        self.lock = threading.Lock()
+
+    def timeout(self):
+        """Returns the timeout to use for the next wait."""
+        with self.lock:
+            if self.average is None:
+                return self.max_timeout
+            return min(self.max_timeout, max(self.min_timeout, self.average * 4))
+
+    def delay(self):
+        """Returns the current backoff, in seconds."""
+        with self.lock:
+            return self.backoff
+
+    def pause(self):
+        """Sleeps for the current backoff before loading another page."""
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+
+    def wait(self, driver, url=None):
+        """Waits for the page in `driver` to be ready and returns (seconds, ready)."""
+        timeout = self.timeout()
+        start = time.monotonic()
+        if self.mode == "network":
+            ready = wait_for_network_idle(driver, timeout=timeout)
+        else:
+            ready = wait_for_selector(driver, self.class_name, timeout=timeout)
+        seconds = time.monotonic() - start
+        self.record(url or driver.current_url, seconds, ready)
+        return seconds, ready
+
+    def record(self, url, seconds, ready):
+        """Updates the average wait and the backoff after one wait."""
+        with self.lock:
+            self.waits.append((url, seconds, ready))
+            self.average = seconds if self.average is None else 0.7 * self.average + 0.3 * seconds
+            if not ready:
+                self.backoff = min(self.max_backoff, max(1.0, self.backoff * 2))
+            elif seconds < self.min_timeout / 2:
+                self.backoff = self.backoff / 2 if self.backoff > 0.25 else 0.0
+
+    def summary(self):
+        """Returns a one line report of how long the waits took."""
+        with self.lock:
+            times = sorted(seconds for _, seconds, _ in self.waits)
+            timeouts = sum(1 for _, _, ready in self.waits if not ready)
+        if not times:
+            return "no waits"
+        return f"{len(times)} waits, mean {sum(times) / len(times):.2f}s, max {times[-1]:.2f}s, {timeouts} timed out"
@@ -0,0 +1,142 @@
+#Crawls a whole list of search queries in one run from a JSON job file, e.g.
+#
+#    {
+#        "workers": 4,
+#        "rate": 2,
+#        "mode": "browser",
+#        "browser_pool": "http://127.0.0.1:9400",
+#        "jobs": [
+#            {"query": "mobile", "pages": 19},
+#            {"query": "laptop", "first_page": 3, "last_page": 10}
+#        ]
+#    }
+#
+#Every query gets its own snapshot store under data/snapshots/<query>. The
+#settings at the top of the job file take the place of the same command line
+#flags (--workers, --rate, --mode, --debugger-address, --browser-pool).
+import argparse
+import json
+import os
+from itertools import zip_longest
+
+from crawl_state import CrawlState
+from crawler import CARD_CLASS, crawl_jobs
+from data.history import PriceHistory
+from data.snapshot_store import SnapshotStore
+from metrics import CrawlMetrics
+from options import add_cache_arguments, add_crawl_arguments, add_record_arguments, driver_maker, page_cache
+from readiness import Readiness
+
+SKIP = object()
+
+
+def check_query(query, path):
+    """Raises ValueError for a query that cannot name a folder of its own under the store folder."""
+    separators = {"/", "\\", os.sep, os.altsep} - {None}
+    if not query.strip() or query in (".", "..") or any(separator in query for separator in separators):
+        raise ValueError(f"Query {query!r} in {path} cannot be a folder name; it must not contain path separators")
+
+
+def load_job_file(path):
+    """Reads the job file, fills in defaults and merges the jobs of the same query.
+
+    Every job ends up with the sorted "page_numbers" to crawl, so a query that
+    is listed twice has its pages crawled once.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if isinstance(config, list):
+        config = {"jobs": config}
+    merged = {}
+    for job in config["jobs"]:
+        if "query" not in job:
+            raise ValueError(f"Job without a query in {path}: {job}")
+        check_query(job["query"], path)
+        first_page = job.pop("first_page", 1)
+        last_page = job.pop("last_page", first_page + job.pop("pages", 19) - 1)
+        pages = range(first_page, last_page + 1)
+        if job["query"] in merged:
+            merged[job["query"]]["page_numbers"].update(pages)
+        else:
+            merged[job["query"]] = {**job, "page_numbers": set(pages)}
+    for job in merged.values():
+        job["page_numbers"] = sorted(job["page_numbers"])
+    config["jobs"] = list(merged.values())
+    return config
+
+
+def interleave(queues):
+    """Takes one item from each list in turn so no query waits for another to finish."""
+    for round_ in zip_longest(*queues, fillvalue=SKIP):
+        for item in round_:
+            if item is not SKIP:
+                yield item
+
+
+def expand_jobs(jobs, state):
+    """Turns the job list into (query, page) pairs that still need crawling, fairly interleaved."""
+    queues = []
+    for job in jobs:
+        pages = state.pending(job["query"], job["page_numbers"])
+        queues.append([(job["query"], page) for page in pages])
+    return list(interleave(queues))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawls every query of a job file with one shared pool of drivers.")
+    parser.add_argument("job_file")
+    parser.add_argument("--output", default="data/snapshots", help="folder holding one snapshot store per query")
+    add_crawl_arguments(parser)
+    add_cache_arguments(parser)
+    add_record_arguments(parser)
+    args = parser.parse_args()
+
+    config = load_job_file(args.job_file)
+    state = CrawlState(args.state)
+    stores = {}
+    for job in config["jobs"]:
+        query = job["query"]
+        stores[query] = SnapshotStore(os.path.join(args.output, query))
+        state.resume(stores[query], query)
+
+    pending = expand_jobs(config["jobs"], state)
+    print(f"{len(pending)} pages left to crawl for {len(stores)} queries")
+    readiness = Readiness(CARD_CLASS)
+    metrics = CrawlMetrics(args.metrics)
+    cache = page_cache(args)
+    history = PriceHistory(args.history) if args.history else None
+    saved = {query: 0 for query in stores}
+
+    #One executor and one per-host rate limit are shared by every query.
+    results = crawl_jobs(
+        pending,
+        workers=config.get("workers", args.workers),
+        rate=config.get("rate", args.rate),
+        base_url=args.base_url,
+        readiness=readiness,
+        mode=config.get("mode", args.mode),
+        debugger_address=config.get("debugger_address", args.debugger_address),
+        make_driver=driver_maker(args, config.get("browser_pool")),
+        cache=cache,
+        metrics=metrics,
+    )
+    try:
+        for query, page, cards in results:
+            count = state.save_page(stores[query], query, page, cards, metrics.record(query, page))
+            metrics.finish(query, page)
+            saved[query] += count
+            print(f"{query} page {page}: {len(cards)} items found, {count} new")
+            if history is not None:
+                history.record_cards(cards, state.started)
+    finally:
+        for store in stores.values():
+            store.close()
+        if history is not None:
+            history.close()
+
+    for query, count in saved.items():
+        print(f"{query}: {count} new items saved")
+    print(readiness.summary())
+    if cache:
+        print(cache.summary())
+    metrics.report()
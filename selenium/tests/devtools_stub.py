@@ -0,0 +1,132 @@
+#A stand-in for Chrome's DevTools endpoint, so cdp.py can be run without a
+#browser. It answers /json/version with its WebSocket URL and then just the
+#commands cdp.py sends: tabs are created and attached, Page.navigate starts a
+#"load" that finishes `load_time` seconds later, and Runtime.evaluate answers
+#the stale-mark, readiness and card-reading expressions. Replies are delayed a
+#little, sent in two fragments and mixed with events and a ping, like Chrome's.
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import struct
+import threading
+
+from cdp import STALE_MARK, WS_GUID, masked
+
+PAGE = re.compile(r"[?&]page=(\d+)")
+
+
+def server_frame(text, fragments=1):
+    """Returns `text` as unmasked server frames, split into `fragments` pieces."""
+    data = text.encode("utf-8")
+    size = -(-len(data) // fragments)
+    pieces = [data[i:i + size] for i in range(0, len(data), size)] or [b""]
+    frames = b""
+    for number, piece in enumerate(pieces):
+        opcode = (0x1 if number == 0 else 0x0) | (0x80 if number == len(pieces) - 1 else 0)
+        if len(piece) < 126:
+            header = struct.pack(">BB", opcode, len(piece))
+        elif len(piece) < 65536:
+            header = struct.pack(">BBH", opcode, 126, len(piece))
+        else:
+            header = struct.pack(">BBQ", opcode, 127, len(piece))
+        frames += header + piece
+    return frames
+
+
+async def read_client_frame(reader):
+    """Returns (opcode, payload) of one masked client frame."""
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size, = struct.unpack(">H", await reader.readexactly(2))
+    elif size == 127:
+        size, = struct.unpack(">Q", await reader.readexactly(8))
+    mask = await reader.readexactly(4)
+    return first & 0x0F, masked(await reader.readexactly(size), mask)
+
+
+class DevToolsStub:
+    """Serves `pages` ({page number: [card html]}) to cdp.py at `address` (host:port)."""
+
+    def __init__(self, pages, load_time=0.2, reply_delay=0.01):
+        self.pages = pages
+        self.load_time = load_time
+        self.reply_delay = reply_delay
+        self.address = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(asyncio.start_server(self.handle, "127.0.0.1", 0), self.loop).result()
+        self.address = "127.0.0.1:%d" % self.server.sockets[0].getsockname()[1]
+        return self
+
+    def __exit__(self, *exc):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def handle(self, reader, writer):
+        request = await reader.readline()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if b"/json/version" in request:
+            body = json.dumps({"webSocketDebuggerUrl": f"ws://{self.address}/devtools/browser/stub"}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n")
+            writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            writer.close()
+            return
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest()).decode()
+        writer.write(f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n".encode())
+        writer.write(b"\x89\x04ping")
+        tabs = {}
+        while True:
+            try:
+                opcode, payload = await read_client_frame(reader)
+            except asyncio.IncompleteReadError:
+                break
+            if opcode == 0x8:
+                break
+            if opcode == 0x1:
+                message = json.loads(payload)
+                result = self.answer(tabs, message["method"], message.get("params", {}), message.get("sessionId"))
+                asyncio.ensure_future(self.reply(writer, message, result))
+        writer.close()
+
+    def answer(self, tabs, method, params, session_id):
+        """Returns the result of one command."""
+        if method == "Target.createTarget":
+            return {"targetId": f"T{len(tabs) + 1}"}
+        if method == "Target.attachToTarget":
+            tabs["S" + params["targetId"]] = {"url": None, "ready_at": 0.0}
+            return {"sessionId": "S" + params["targetId"]}
+        tab = tabs.get(session_id)
+        if method == "Page.navigate":
+            tab.update(url=params["url"], ready_at=self.loop.time() + self.load_time)
+            return {"frameId": "F"}
+        if method == "Runtime.evaluate":
+            expression = params["expression"]
+            if expression.startswith(f"window.{STALE_MARK}"):
+                return {"result": {"type": "boolean", "value": True}}
+            if expression.startswith(f"!window.{STALE_MARK}"):
+                return {"result": {"type": "boolean", "value": self.loop.time() >= tab["ready_at"]}}
+            page = int(PAGE.search(tab["url"]).group(1))
+            return {"result": {"type": "object", "value": self.pages.get(page, [])}}
+        return {}
+
+    async def reply(self, writer, message, result):
+        await asyncio.sleep(self.reply_delay)
+        reply = {"id": message["id"], "result": result}
+        if "sessionId" in message:
+            reply["sessionId"] = message["sessionId"]
+        writer.write(server_frame(json.dumps(reply), fragments=2))
+        writer.write(server_frame(json.dumps({"method": "Page.frameNavigated", "params": {}})))
@@ -0,0 +1,56 @@
+import pytest
+
+from data.backends import BACKENDS, FAST_SUFFIX, check_backends, get_backend
+from data.fastpath import FAST_FIELDS
+from data.fieldspec import FIELDS
+from fixtures import fixture_documents, fixture_page
+
+
+def available(names):
+    """Returns the backends whose parser package is installed."""
+    found = []
+    for name in names:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        found.append(name)
+    return found
+
+
+@pytest.fixture(scope="module")
+def documents():
+    return fixture_documents(pages=3)
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_matches_bs4_on_every_field(documents, name):
+    if name not in available([name]):
+        pytest.skip(f"{name} is not installed")
+    assert check_backends(documents, [name], fields=list(FIELDS)) == []
+
+
+@pytest.mark.parametrize("name", [name + FAST_SUFFIX for name in BACKENDS])
+def test_fast_path_matches_bs4(documents, name):
+    if name not in available([name]):
+        pytest.skip(f"{name} is not installed")
+    assert check_backends(documents, [name], fields=list(FAST_FIELDS)) == []
+
+
+def test_fixture_cards_have_every_field(documents):
+    backend = get_backend("bs4", list(FIELDS))
+    for _, card in documents:
+        assert all(backend.parse(card))
+
+
+def test_cards_are_checked_one_by_one(tmp_path):
+    from data.collect import iter_documents
+
+    (tmp_path / "search_1.html").write_text(fixture_page(1, cards=5), encoding="utf-8")
+    names = [name for name, _ in iter_documents(str(tmp_path), str(tmp_path / "snapshots"))]
+    assert names == [f"search_1.html#{position}" for position in range(1, 6)]
+
+
+def test_page_without_product_is_no_product_everywhere():
+    names = available([*BACKENDS, *(name + FAST_SUFFIX for name in BACKENDS)])
+    assert check_backends([("empty", "<div class=\"_75nlfW\"></div>")], names) == []
@@ -0,0 +1,152 @@
+import itertools
+import threading
+import time
+from urllib.error import HTTPError
+
+import pytest
+
+import browser_pool
+from browser_pool import BrowserPool, PoolClient, keep_leased, pool_server
+
+PORTS = itertools.count(9001)
+
+
+class FakeSwitch:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def window(self, handle):
+        self.driver.current = handle
+
+
+class FakeDriver:
+    """Stands in for a Chrome driver: three tabs, records CDP commands, can be made unresponsive."""
+
+    def __init__(self):
+        self.port = next(PORTS)
+        self.capabilities = {"goog:chromeOptions": {"debuggerAddress": f"127.0.0.1:{self.port}"}}
+        self.window_handles = ["first", "second", "third"]
+        self.switch_to = FakeSwitch(self)
+        self.commands = []
+        self.alive = True
+        self.quit_called = False
+
+    def close(self):
+        self.window_handles.remove(self.current)
+
+    def get(self, url):
+        pass
+
+    def execute_cdp_cmd(self, command, params):
+        if not self.alive:
+            raise RuntimeError("browser is gone")
+        self.commands.append(command)
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("browser is gone")
+        return 1
+
+    def quit(self):
+        self.quit_called = True
+
+
+@pytest.fixture(autouse=True)
+def no_devtools(monkeypatch):
+    #The health check also asks the DevTools endpoint, which a fake driver does not have.
+    monkeypatch.setattr(browser_pool, "browser_websocket_url", lambda address: f"ws://{address}/devtools/browser")
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(size, **options):
+        pools.append(BrowserPool(size, FakeDriver, **options).start())
+        return pools[-1]
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+@pytest.fixture
+def client():
+    servers = []
+
+    def connect(pool):
+        server = pool_server(pool, 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return PoolClient(f"http://127.0.0.1:{server.server_address[1]}")
+
+    yield connect
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def browser_at(pool, address):
+    return next(browser for browser in pool.browsers if browser.address == address)
+
+
+def test_released_browser_is_reset_and_leased_again(make_pool):
+    pool = make_pool(2)
+    first, second = pool.lease(0), pool.lease(0)
+    assert first[1] != second[1]
+    assert pool.lease(0.1) is None
+    threading.Timer(0.1, pool.release, args=(first[0],)).start()
+    again = pool.lease(2)
+    assert again[1] == first[1]
+    driver = browser_at(pool, first[1]).driver
+    assert driver.window_handles == ["first"]
+    assert "Network.clearBrowserCookies" in driver.commands
+    assert not pool.release("unknown")
+
+
+def test_unreturned_lease_expires(make_pool):
+    pool = make_pool(1, lease_ttl=0.3, check_every=0.1)
+    lease, _ = pool.lease(0)
+    assert pool.lease(1) is not None
+    assert not pool.renew(lease)
+
+
+def test_browser_failing_its_health_check_is_replaced(make_pool):
+    pool = make_pool(2, check_every=0.1)
+    dead = pool.browsers[0]
+    dead.driver.alive = False
+    deadline = time.monotonic() + 2
+    while dead in pool.browsers and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert dead.driver.quit_called
+    assert dead not in pool.browsers
+    assert len(pool.browsers) == 2
+
+
+def test_service_hands_out_and_takes_back_leases(make_pool, client):
+    pool = make_pool(1)
+    pool_client = client(pool)
+    lease = pool_client.lease(1)
+    assert lease["debugger_address"] == pool.browsers[0].address
+    assert [browser["leased"] for browser in pool_client.status()] == [True]
+    with pytest.raises(HTTPError) as error:
+        pool_client.lease(0.1)
+    assert error.value.code == 503
+    assert pool_client.release(lease["lease"])
+    assert not pool_client.release(lease["lease"])
+
+
+def test_heartbeat_keeps_a_lease_alive(make_pool, client):
+    pool = make_pool(1, lease_ttl=0.6, check_every=0.1)
+    pool_client = client(pool)
+    lease = pool_client.lease(1)
+    stopped = threading.Event()
+    heartbeat = threading.Thread(target=keep_leased, args=(pool_client, lease, stopped), daemon=True)
+    heartbeat.start()
+    time.sleep(1.5)
+    assert pool_client.renew(lease["lease"])
+    stopped.set()
+    heartbeat.join()
+    time.sleep(1.0)
+    assert not pool_client.renew(lease["lease"])
+    assert pool_client.lease(1)["lease"] != lease["lease"]
@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from cdp import crawl_jobs_cdp
+from devtools_stub import DevToolsStub
+from fixtures import fixture_page_cards
+from readiness import Readiness
+
+PAGES = {page: fixture_page_cards(page, cards=6) for page in range(1, 4)}
+
+
+@pytest.fixture
+def devtools():
+    with DevToolsStub(PAGES) as stub:
+        yield stub.address
+
+
+def test_every_page_is_crawled_in_tabs(devtools):
+    jobs = [(query, page) for query in ("mobile", "laptop") for page in PAGES]
+    crawled = crawl_jobs_cdp(jobs, workers=3, rate=0, readiness=Readiness(), debugger_address=devtools)
+    got = {(query, page): cards for query, page, cards in crawled}
+    assert got == {(query, page): PAGES[page] for query, page in jobs}
+
+
+def test_tabs_keep_loading_while_the_caller_is_busy(devtools):
+    #Pages are ready 0.2s after loading starts. A caller spending 0.6s on every
+    #page must not leave the other tabs unpolled until their 0.5s deadline passes.
+    readiness = Readiness(max_timeout=0.5)
+    jobs = [(query, page) for query in ("mobile", "laptop", "tablet") for page in PAGES]
+    for _ in crawl_jobs_cdp(jobs, workers=4, rate=100, readiness=readiness, debugger_address=devtools):
+        time.sleep(0.6)
+    assert len(readiness.waits) == len(jobs)
+    assert all(ready for _, _, ready in readiness.waits)
+
+
+def test_stopping_early_shuts_the_loop_down(devtools):
+    threads = threading.active_count()
+    crawled = crawl_jobs_cdp([("mobile", page) for page in PAGES], workers=2, rate=0, readiness=Readiness(), debugger_address=devtools)
+    next(crawled)
+    crawled.close()
+    assert threading.active_count() == threads
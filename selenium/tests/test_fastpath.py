@@ -0,0 +1,68 @@
+import random
+import re
+
+import pytest
+
+from data.backends import check_backends, get_backend
+from data.fastpath import FAST_FIELDS, extract, take_stats
+from fixtures import fixture_card
+
+PRICE_DIV = re.compile(r'<div class="Nx9bqj _4b5DiR">[^<]*</div>')
+CONTAINER_CLOSE = "</a></div>"
+
+
+@pytest.fixture
+def card():
+    return fixture_card(random.Random(7), 1, 1)
+
+
+def same_as_bs4(html_doc):
+    """Returns True if bs4+fast gives what bs4 gives for the fast path fields."""
+    return check_backends([("card", html_doc)], ["bs4+fast"], fields=list(FAST_FIELDS)) == []
+
+
+def test_regular_card_takes_the_fast_path(card):
+    take_stats()
+    values = get_backend("bs4+fast", FAST_FIELDS).parse(card)
+    assert values == get_backend("bs4", FAST_FIELDS).parse(card)
+    assert take_stats() == {"fast": 1, "fallback": 0}
+
+
+def test_price_outside_the_container_is_not_read(card):
+    price = PRICE_DIV.search(card).group(0)
+    moved = PRICE_DIV.sub("", card).replace(CONTAINER_CLOSE, CONTAINER_CLOSE + price, 1)
+    assert extract(moved) is None
+    assert same_as_bs4(moved)
+
+
+def test_link_outside_the_container_is_not_read(card):
+    link = re.search(r'<a class="CGtC98" href="[^"]*"', card).group(0)
+    moved = card.replace(link, "<a", 1).replace(CONTAINER_CLOSE, CONTAINER_CLOSE + link + "></a>", 1)
+    assert extract(moved) is None
+    assert same_as_bs4(moved)
+
+
+@pytest.mark.parametrize("inside", ["<!-- <div> -->", "<script>'<div>'</script>", "<div/>"])
+def test_container_end_that_cannot_be_counted_falls_back(card, inside):
+    changed = card.replace('<div class="Otbq5D">', inside + '<div class="Otbq5D">', 1)
+    assert extract(changed) is None
+    assert same_as_bs4(changed)
+
+
+def test_unclosed_container_falls_back(card):
+    cut = card[:card.rindex(CONTAINER_CLOSE) + len("</a>")]
+    assert extract(cut) is None
+    assert same_as_bs4(cut)
+
+
+def test_title_with_markup_falls_back(card):
+    changed = re.sub(r'(<div class="KzDlHZ">)', r"\1<b>New</b> ", card, count=1)
+    assert extract(changed) is None
+    assert same_as_bs4(changed)
+
+
+def test_other_fields_always_fall_back(card):
+    take_stats()
+    backend = get_backend("bs4+fast", ("title", "rating"))
+    assert backend.parse(card) == get_backend("bs4", ("title", "rating")).parse(card)
+    assert take_stats() == {"fast": 0, "fallback": 1}